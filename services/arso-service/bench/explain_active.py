@@ -0,0 +1,118 @@
+"""Check that the active-alert lookup of /events/active is served by an index.
+
+Seeds ``--rows`` alerts spread over ``--areas`` areas (most of them expired)
+into alert_info, runs ANALYZE, and EXPLAINs db.ACTIVE_EVENTS_QUERY and its
+variant without texts with a text[] area parameter. Fails unless every plan
+reads alert_info through idx_alert_info_area_key_expires (or its per-partition
+copies) and never with a Seq Scan over a partition holding rows. Everything
+runs in one transaction that is rolled back, so any database with the schema
+created by arso-sync will do:
+
+    DB_HOST=localhost DB_NAME=arso python bench/explain_active.py
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+import asyncpg
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from db import (  # noqa: E402
+    ACTIVE_EVENTS_QUERY,
+    ACTIVE_EVENTS_WITHOUT_TEXTS_QUERY,
+    DATABASE_CONFIG,
+    normalize_area,
+)
+
+INDEX_NAME = "idx_alert_info_area_key_expires"
+INDEX_SCANS = ("Index Scan", "Index Only Scan", "Bitmap Index Scan")
+
+
+def plan_nodes(node: dict):
+    yield node
+    for child in node.get("Plans", ()):
+        yield from plan_nodes(child)
+
+
+async def seed(conn, rows: int, areas: int):
+    await conn.execute("""
+        INSERT INTO alert_info (alert_identifier, language, event, effective, onset, expires,
+                               severity, urgency, certainty, headline, area)
+        SELECT 'explain-check-' || n, 'en-GB', 'wind', NOW() - interval '3 days',
+               NOW() - interval '3 days',
+               -- One row in twenty is still active, the rest expired during the last days
+               CASE WHEN n % 20 = 0 THEN NOW() + interval '1 day'
+                    ELSE NOW() - (n % 72) * interval '1 hour' - interval '1 minute' END,
+               'Moderate', 'Future', 'Likely', 'Explain check ' || n,
+               'SI-Area-' || lpad((n % $2)::text, 4, '0')
+        FROM generate_series(1, $1) AS n
+    """, rows, areas)
+    await conn.execute("ANALYZE alert_info")
+
+
+async def check(conn, name: str, query: str, area_keys: list) -> list:
+    """Problems found in the plan of ``query``; empty when it uses the index."""
+    plan = json.loads(await conn.fetchval("EXPLAIN (FORMAT JSON) " + query, area_keys))[0]["Plan"]
+    print(f"--- {name}")
+    print("\n".join(row["QUERY PLAN"] for row in await conn.fetch("EXPLAIN " + query, area_keys)))
+
+    problems = []
+    used_index = False
+    for node in plan_nodes(plan):
+        if node["Node Type"] == "Seq Scan" and node["Relation Name"].startswith("alert_info"):
+            tuples = await conn.fetchval("SELECT reltuples FROM pg_class WHERE relname = $1", node["Relation Name"])
+            if tuples > 0:
+                problems.append(f"{name}: Seq Scan on {node['Relation Name']} ({int(tuples)} rows)")
+        elif node["Node Type"] in INDEX_SCANS:
+            # Partitions have their own copies of the index, named after the partition
+            index, table = await conn.fetchrow("""
+                SELECT pg_partition_root(indexrelid)::text, pg_partition_root(indrelid)::text
+                FROM pg_index WHERE indexrelid = $1::regclass
+            """, node["Index Name"])
+            if index == INDEX_NAME:
+                used_index = True
+            elif table == "alert_info":
+                problems.append(f"{name}: alert_info read through {node['Index Name']} instead of {INDEX_NAME}")
+
+    if not used_index:
+        problems.append(f"{name}: {INDEX_NAME} not used")
+    return problems
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--rows", type=int, default=50000, help="alerts to seed")
+    parser.add_argument("--areas", type=int, default=200, help="distinct areas of the seeded alerts")
+    args = parser.parse_args()
+
+    conn = await asyncpg.connect(**DATABASE_CONFIG)
+    try:
+        if await conn.fetchval("SELECT to_regclass('alert_info')") is None:
+            sys.exit("alert_info does not exist; start arso-sync once to create the schema")
+
+        transaction = conn.transaction()
+        await transaction.start()
+        try:
+            await seed(conn, args.rows, args.areas)
+            area_keys = [normalize_area(f"SI-Area-{n:04d}") for n in (1, 2, 3)]
+            problems = await check(conn, "ACTIVE_EVENTS_QUERY", ACTIVE_EVENTS_QUERY, area_keys)
+            problems += await check(conn, "ACTIVE_EVENTS_WITHOUT_TEXTS_QUERY",
+                                    ACTIVE_EVENTS_WITHOUT_TEXTS_QUERY, area_keys)
+        finally:
+            await transaction.rollback()
+    finally:
+        await conn.close()
+
+    if problems:
+        print("\nFAIL")
+        for problem in problems:
+            print(f"  {problem}")
+        sys.exit(1)
+    print(f"\nOK: both queries read alert_info through {INDEX_NAME}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
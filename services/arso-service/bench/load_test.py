@@ -0,0 +1,112 @@
+"""Concurrent load test for arso-service's /events/active.
+
+Opens ``--concurrency`` keep-alive connections that each issue requests back to
+back for ``--duration`` seconds, then reports requests/second and latency
+percentiles. Run it once against a build of the previous (threadpool) version
+and once against the current one to compare:
+
+    python bench/load_test.py --url http://localhost:8000 --concurrency 300 --duration 30
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from urllib.parse import urlencode, urlsplit
+
+
+async def read_response(reader: asyncio.StreamReader) -> int:
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    status = int(lines[0].split(" ", 2)[1])
+
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+
+    if headers.get("transfer-encoding") == "chunked":
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        await reader.readexactly(int(headers.get("content-length", "0")))
+    return status
+
+
+async def client(host: str, port: int, request: bytes, deadline: float, latencies: list, errors: list):
+    reader = writer = None
+    while time.monotonic() < deadline:
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            started = time.perf_counter()
+            writer.write(request)
+            await writer.drain()
+            status = await read_response(reader)
+            latencies.append(time.perf_counter() - started)
+            if status != 200:
+                errors.append(status)
+        except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+            errors.append(type(e).__name__)
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+
+    if writer is not None:
+        writer.close()
+
+
+def percentile(ordered: list, fraction: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def run(args):
+    url = urlsplit(args.url)
+    params = {"organization_name": "public", "areas": args.areas}
+    if args.summary:
+        params["summary"] = "true"
+    query = urlencode(params)
+    request = (
+        f"GET /events/active?{query} HTTP/1.1\r\n"
+        f"Host: {url.netloc}\r\n"
+        "Connection: keep-alive\r\n\r\n"
+    ).encode()
+
+    latencies = []
+    errors = []
+    started = time.monotonic()
+    deadline = started + args.duration
+    await asyncio.gather(*(
+        client(url.hostname, url.port or 80, request, deadline, latencies, errors)
+        for _ in range(args.concurrency)
+    ))
+    elapsed = time.monotonic() - started
+
+    if not latencies:
+        print(f"No successful requests ({len(errors)} errors)")
+        return
+
+    ordered = sorted(latencies)
+    print(f"{len(latencies)} requests from {args.concurrency} clients in {elapsed:.1f}s, {len(errors)} errors")
+    print(f"throughput: {len(latencies) / elapsed:,.0f} req/s")
+    print(f"latency avg={statistics.mean(ordered) * 1000:.1f}ms p50={percentile(ordered, 0.5) * 1000:.1f}ms "
+          f"p95={percentile(ordered, 0.95) * 1000:.1f}ms p99={percentile(ordered, 0.99) * 1000:.1f}ms "
+          f"max={ordered[-1] * 1000:.1f}ms")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--url", default="http://localhost:8000")
+    arg_parser.add_argument("--areas", default="Middle,North-East,South-West")
+    arg_parser.add_argument("--concurrency", type=int, default=300)
+    arg_parser.add_argument("--duration", type=float, default=30)
+    arg_parser.add_argument("--summary", action="store_true", help="request the summary projection")
+    args = arg_parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
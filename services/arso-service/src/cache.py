@@ -0,0 +1,101 @@
+import heapq
+import threading
+from datetime import datetime, timezone
+
+
+def alert_key(row: dict) -> tuple:
+    return row["alert_identifier"], row["language"], row["event"], row["onset"], row["expires"]
+
+
+def area_key(area: str) -> str:
+    return area.strip().lower() if area else None
+
+
+class ActiveAlertCache:
+    """Active ARSO alerts held in memory and indexed by normalized area.
+
+    Rows have the same shape as the ones returned by db.get_active_events. Expired
+    rows are never returned and are dropped by evict_expired.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rows = {}
+        self._by_area = {}
+        self._expiry_heap = []
+        self.ready = False
+        self.loaded_at = None
+
+    def load(self, rows: list) -> list:
+        """Replace the whole cache with ``rows``, e.g. on startup or a periodic resync.
+
+        Returns the rows that were not cached before, so alerts whose event was
+        missed still reach the streams; nothing on the first load.
+        """
+        with self._lock:
+            previous_rows = self._rows
+            was_ready = self.ready
+            self._rows = {}
+            self._by_area = {}
+            self._expiry_heap = []
+            for row in rows:
+                self._add(row)
+            self.ready = True
+            self.loaded_at = datetime.now(timezone.utc)
+            if not was_ready:
+                return []
+            return [row for key, row in self._rows.items() if previous_rows.get(key) != row]
+
+    def upsert(self, rows: list) -> list:
+        """Add or replace ``rows``; returns those that are new or differ from the cached row."""
+        with self._lock:
+            return [row for row in rows if self._add(row)]
+
+    def _add(self, row: dict) -> bool:
+        key = alert_key(row)
+        previous = self._rows.get(key)
+        if previous is not None:
+            if previous == row:
+                return False
+            self._by_area.get(area_key(previous["area"]), {}).pop(key, None)
+
+        self._rows[key] = row
+        self._by_area.setdefault(area_key(row["area"]), {})[key] = row
+        heapq.heappush(self._expiry_heap, (row["expires"], key))
+        return True
+
+    def get(self, areas: list) -> list:
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            return [
+                row
+                for area in {area_key(a) for a in areas}
+                for row in self._by_area.get(area, {}).values()
+                if row["expires"] >= now
+            ]
+
+    def evict_expired(self) -> int:
+        now = datetime.now(timezone.utc)
+        evicted = 0
+        with self._lock:
+            while self._expiry_heap and self._expiry_heap[0][0] < now:
+                _, key = heapq.heappop(self._expiry_heap)
+                row = self._rows.pop(key, None)
+                if row is None:
+                    continue
+                area_rows = self._by_area.get(area_key(row["area"]))
+                if area_rows is not None:
+                    area_rows.pop(key, None)
+                    if not area_rows:
+                        del self._by_area[area_key(row["area"])]
+                evicted += 1
+        return evicted
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "ready": self.ready,
+                "alerts": len(self._rows),
+                "areas": len(self._by_area),
+                "loaded_at": self.loaded_at.isoformat() if self.loaded_at else None,
+            }
@@ -0,0 +1,72 @@
+import json
+import logging
+import os
+import threading
+import time
+
+import pika
+
+RABBIT_HOST = os.getenv("RABBITMQ_HOST")
+RABBIT_EXCHANGE = os.getenv("RABBITMQ_EXCHANGE", "events")
+ROUTING_KEY = os.getenv("RABBITMQ_ROUTING_KEY", "arso")
+
+
+def start_consumer(on_event_callback, on_connected_callback=None):
+    """Follow the arso event stream in a background thread.
+
+    Every pod gets its own exclusive, auto-deleted queue so it sees every event
+    (companies-filter keeps consuming the shared events_queue). Because events
+    published while disconnected are missed, ``on_connected_callback`` runs after
+    each (re)connect so the caller can resynchronise.
+    """
+    def consume_loop():
+        while True:
+            try:
+                logging.info("[RabbitMQ] Starting arso event consumer...")
+
+                connection = pika.BlockingConnection(
+                    pika.ConnectionParameters(host=RABBIT_HOST)
+                )
+                channel = connection.channel()
+
+                channel.exchange_declare(
+                    exchange=RABBIT_EXCHANGE,
+                    exchange_type="direct",
+                    durable=True
+                )
+
+                result = channel.queue_declare(queue="", exclusive=True, auto_delete=True)
+                queue_name = result.method.queue
+                channel.queue_bind(
+                    exchange=RABBIT_EXCHANGE,
+                    queue=queue_name,
+                    routing_key=ROUTING_KEY
+                )
+                logging.info(f"[RabbitMQ] Bound queue '{queue_name}' → '{ROUTING_KEY}'")
+
+                if on_connected_callback:
+                    on_connected_callback()
+
+                def callback(ch, method, properties, body):
+                    try:
+                        on_event_callback(json.loads(body))
+                    except Exception as e:
+                        logging.error(f"[RabbitMQ] Processing error: {e}")
+
+                channel.basic_consume(
+                    queue=queue_name,
+                    on_message_callback=callback,
+                    auto_ack=True
+                )
+                channel.start_consuming()
+
+            except pika.exceptions.AMQPError as e:
+                logging.error(f"[RabbitMQ] Connection lost: {e}")
+            except Exception as e:
+                logging.error(f"[RabbitMQ] Unexpected error: {e}")
+
+            logging.info("[RabbitMQ] Reconnecting in 2 seconds...")
+            time.sleep(2)
+
+    thread = threading.Thread(target=consume_loop, daemon=True)
+    thread.start()
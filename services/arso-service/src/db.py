@@ -1,50 +1,198 @@
-from datetime import datetime
-
-import psycopg2
-from psycopg2 import sql
-from psycopg2.extras import RealDictCursor
+import asyncio
 import os
+from contextlib import asynccontextmanager
+from pool import ConnectionPool
 
 DATABASE_CONFIG = {
     'host': os.getenv('DB_HOST'),
-    'port': os.getenv('DB_PORT'),
+    'port': int(os.getenv('DB_PORT', '5432')),
     'database': os.getenv('DB_NAME'),
     'user': os.getenv('DB_USER'),
     'password': os.getenv('DB_PASSWORD')
 }
 
-def get_connection():
-    """Create and return a database connection."""
-    return psycopg2.connect(**DATABASE_CONFIG)
-
-
-def get_active_events(areas: list):
-    conn = get_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    try:
-        if len(areas) == 1:
-            query = """
-                SELECT * FROM alert_info
-                  WHERE LOWER(area) = LOWER(%s)
-                  AND expires >= NOW()
-            """
-            params = [areas[0]]
-
-        else:
-            placeholders = ",".join(["LOWER(%s)"] * len(areas))
-            query = f"""
-                SELECT * FROM alert_info
-                  WHERE LOWER(area) IN ({placeholders})
-                  AND expires >= NOW()
-            """
-            params = areas
-
-        cursor.execute(sql.SQL(query), params)
-        return cursor.fetchall()
-
-    except Exception as e:
-        print(f"Error retrieving events: {e}")
-        return []
-    finally:
-        cursor.close()
-        conn.close()
\ No newline at end of file
+POOL_CONFIG = {
+    'minconn': int(os.getenv('DB_POOL_MIN', '1')),
+    'maxconn': int(os.getenv('DB_POOL_MAX', '10')),
+    'acquire_timeout': float(os.getenv('DB_POOL_TIMEOUT', '5')),
+    'max_idle': float(os.getenv('DB_POOL_MAX_IDLE', '30')),
+}
+
+pool = None
+pool_lock = asyncio.Lock()
+
+
+async def open_pool() -> ConnectionPool:
+    """Open the process-wide connection pool unless it is already open.
+
+    Called from the app startup hook and again on first use, so the service
+    starts and answers 503 while Postgres is still unreachable instead of
+    failing startup. Raises PoolUnavailable when the database cannot be reached.
+    """
+    global pool
+
+    if pool is None:
+        async with pool_lock:
+            if pool is None:
+                opened = ConnectionPool(**POOL_CONFIG, **DATABASE_CONFIG)
+                await opened.open()
+                pool = opened
+    return pool
+
+
+@asynccontextmanager
+async def connection():
+    async with (await open_pool()).connection() as conn:
+        yield conn
+
+
+async def close_pool():
+    global pool
+
+    if pool is not None:
+        await pool.close()
+        pool = None
+
+
+def pool_stats() -> dict:
+    return pool.stats() if pool is not None else {}
+
+
+# alert_info keeps description/instruction as hashes into alert_text
+ALERT_SELECT = """
+    SELECT a.id, a.alert_identifier, a.language, a.event, a.effective, a.onset,
+           a.expires, a.severity, a.urgency, a.certainty, a.headline,
+           d.body AS description, i.body AS instruction, a.created_at, a.area
+    FROM alert_info a
+    LEFT JOIN alert_text d ON d.hash = a.description_hash
+    LEFT JOIN alert_text i ON i.hash = a.instruction_hash
+"""
+
+ALERT_SELECT_WITHOUT_TEXTS = """
+    SELECT a.id, a.alert_identifier, a.language, a.event, a.effective, a.onset,
+           a.expires, a.severity, a.urgency, a.certainty, a.headline,
+           a.created_at, a.area
+    FROM alert_info a
+"""
+
+ACTIVE_EVENTS_FILTER = """
+    WHERE a.area_key = ANY($1::text[])
+      AND a.expires >= NOW()
+"""
+
+# Served by idx_alert_info_area_key_expires (area_key, expires)
+ACTIVE_EVENTS_QUERY = ALERT_SELECT + ACTIVE_EVENTS_FILTER
+ACTIVE_EVENTS_WITHOUT_TEXTS_QUERY = ALERT_SELECT_WITHOUT_TEXTS + ACTIVE_EVENTS_FILTER
+
+
+def normalize_area(area: str) -> str:
+    return area.strip().lower()
+
+
+async def get_active_events(areas: list, include_texts: bool = True):
+    """Active alerts for ``areas``; without ``include_texts`` the alert_text joins are skipped.
+
+    Errors propagate so a failed read is never served as a cacheable empty result.
+    """
+    query = ACTIVE_EVENTS_QUERY if include_texts else ACTIVE_EVENTS_WITHOUT_TEXTS_QUERY
+    async with connection() as conn:
+        area_keys = [normalize_area(area) for area in areas]
+        return [dict(row) for row in await conn.fetch(query, area_keys)]
+
+
+async def get_all_active_events():
+    """All active alerts, used to warm and resynchronise the in-memory cache."""
+    async with connection() as conn:
+        rows = await conn.fetch(ALERT_SELECT + " WHERE a.expires >= NOW()")
+        return [dict(row) for row in rows]
+
+
+async def get_active_events_by_identifier(identifier: str):
+    """Active alerts of one CAP document, in every language."""
+    async with connection() as conn:
+        rows = await conn.fetch(ALERT_SELECT + " WHERE a.alert_identifier = $1 AND a.expires >= NOW()",
+                                identifier)
+        return [dict(row) for row in rows]
+
+
+HISTORY_COLUMNS = """
+    a.id, a.alert_identifier, a.language, a.event, a.effective, a.onset,
+    a.expires, a.severity, a.urgency, a.certainty, a.headline,
+    d.body AS description, i.body AS instruction, a.created_at, a.area
+"""
+
+HISTORY_COLUMNS_WITHOUT_TEXTS = """
+    a.id, a.alert_identifier, a.language, a.event, a.effective, a.onset,
+    a.expires, a.severity, a.urgency, a.certainty, a.headline, a.created_at, a.area
+"""
+
+
+async def get_alert_history(start, end, area: str = None, severity: str = None, event: str = None,
+                            language: str = None, after: tuple = None, limit: int = 100,
+                            include_texts: bool = True):
+    """Alerts with onset in [start, end), newest first, from alert_info and its archive.
+
+    Paginated by keyset: ``after`` is the (onset, id) of the last row of the
+    previous page. Without ``include_texts`` the alert_text joins are skipped.
+    """
+    # expires >= start lets Postgres skip archive partitions that ended before the range
+    conditions = ["a.onset >= $1", "a.onset < $2", "a.expires >= $1"]
+    params = [start, end]
+
+    def add(condition: str, value):
+        params.append(value)
+        conditions.append(condition.format(f"${len(params)}"))
+
+    if area:
+        add("a.area_key = {}", normalize_area(area))
+    if severity:
+        add("a.severity = {}", severity)
+    if event:
+        add("a.event = {}", event)
+    if language:
+        add("a.language = {}", language)
+    if after:
+        params.extend(after)
+        conditions.append(f"(a.onset, a.id) < (${len(params) - 1}, ${len(params)})")
+    params.append(limit)
+
+    columns = HISTORY_COLUMNS_WITHOUT_TEXTS
+    joins = ""
+    if include_texts:
+        columns = HISTORY_COLUMNS
+        joins = """
+            LEFT JOIN alert_text d ON d.hash = a.description_hash
+            LEFT JOIN alert_text i ON i.hash = a.instruction_hash
+        """
+
+    query = f"""
+        SELECT {columns}
+        FROM alert_history a
+        {joins}
+        WHERE {" AND ".join(conditions)}
+        ORDER BY a.onset DESC, a.id DESC
+        LIMIT ${len(params)}
+    """
+    async with connection() as conn:
+        return [dict(row) for row in await conn.fetch(query, *params)]
+
+
+async def get_alert_daily_stats(start, end, area: str = None, severity: str = None, event: str = None,
+                                language: str = None):
+    """Per-day alert counts from alert_daily_stats for days in [start, end]."""
+    conditions = ["day >= $1", "day <= $2"]
+    params = [start, end]
+    for column, value in (("area_key", normalize_area(area) if area else None), ("severity", severity),
+                          ("event", event), ("language", language)):
+        if value:
+            params.append(value)
+            conditions.append(f"{column} = ${len(params)}")
+
+    query = f"""
+        SELECT day, area_key, severity, event, language, alerts
+        FROM alert_daily_stats
+        WHERE {" AND ".join(conditions)}
+        ORDER BY day, area_key, severity, event, language
+    """
+    async with connection() as conn:
+        return [dict(row) for row in await conn.fetch(query, *params)]
@@ -0,0 +1,59 @@
+import asyncio
+
+from cache import area_key
+
+
+class Subscription:
+    """One open stream: the areas it follows and a bounded queue of pending rows."""
+    __slots__ = ("areas", "queue", "lagged")
+
+    def __init__(self, areas: set, queue_size: int):
+        self.areas = areas
+        self.queue = asyncio.Queue(queue_size)
+        self.lagged = False
+
+
+class AlertHub:
+    """Fans new alert rows out to stream subscribers, indexed by normalized area.
+
+    Only touched from the event loop thread. Queues hold references to the cached
+    row dicts rather than copies, so an idle subscription costs a few hundred
+    bytes. A subscriber whose queue fills up is marked lagged and stops receiving;
+    its stream ends once drained and the client reconnects with Last-Event-ID.
+    """
+
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self._by_area = {}
+        self.subscribers = 0
+        self.lagged = 0
+
+    def subscribe(self, areas: list) -> Subscription:
+        subscription = Subscription({area_key(a) for a in areas if a and a.strip()}, self.queue_size)
+        for area in subscription.areas:
+            self._by_area.setdefault(area, set()).add(subscription)
+        self.subscribers += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        for area in subscription.areas:
+            area_subscriptions = self._by_area.get(area)
+            if area_subscriptions is not None:
+                area_subscriptions.discard(subscription)
+                if not area_subscriptions:
+                    del self._by_area[area]
+        self.subscribers -= 1
+
+    def publish(self, rows: list):
+        for row in rows:
+            for subscription in self._by_area.get(area_key(row["area"]), ()):
+                if subscription.lagged:
+                    continue
+                try:
+                    subscription.queue.put_nowait(row)
+                except asyncio.QueueFull:
+                    subscription.lagged = True
+                    self.lagged += 1
+
+    def stats(self) -> dict:
+        return {"subscribers": self.subscribers, "areas": len(self._by_area), "lagged": self.lagged}
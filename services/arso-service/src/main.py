@@ -1,19 +1,336 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Query, Response
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from typing import Optional
-from datetime import datetime, timezone
+from collections import OrderedDict
+from datetime import date, datetime, timezone
+import asyncio
+import base64
+import hashlib
 import logging
-from db import get_active_events
+import orjson
+import os
+import time
+from cache import ActiveAlertCache, area_key
+from consumer import start_consumer
+from hub import AlertHub
+from db import (
+    close_pool,
+    open_pool,
+    get_active_events,
+    get_active_events_by_identifier,
+    get_alert_daily_stats,
+    get_alert_history,
+    get_all_active_events,
+    pool_stats
+)
+from pool import PoolTimeout
 
-app = FastAPI()
+logging.basicConfig(level=logging.INFO)
+
+CACHE_RESYNC_SECONDS = int(os.getenv("CACHE_RESYNC_SECONDS", "300"))
+CACHE_EVICT_SECONDS = int(os.getenv("CACHE_EVICT_SECONDS", "15"))
+CACHE_REFRESH_MERGE_SECONDS = float(os.getenv("CACHE_REFRESH_MERGE_SECONDS", "10"))
+EVENTS_CACHE_CONTROL = os.getenv("EVENTS_CACHE_CONTROL", "public, max-age=60")
+GZIP_MINIMUM_SIZE = int(os.getenv("GZIP_MINIMUM_SIZE", "1000"))
+BATCH_MAX_AREAS = int(os.getenv("BATCH_MAX_AREAS", "500"))
+STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", "100"))
+STREAM_KEEPALIVE_SECONDS = float(os.getenv("STREAM_KEEPALIVE_SECONDS", "15"))
+STREAM_MAX_SUBSCRIBERS = int(os.getenv("STREAM_MAX_SUBSCRIBERS", "10000"))
+
+EVENT_FIELDS = (
+    "id", "alert_identifier", "language", "event", "effective", "onset", "expires",
+    "severity", "urgency", "certainty", "headline", "description", "instruction",
+    "created_at", "area",
+)
+SUMMARY_FIELDS = ("headline", "area", "severity", "onset", "expires")
+TEXT_FIELDS = {"description", "instruction"}
+
+app = FastAPI(default_response_class=ORJSONResponse)
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MINIMUM_SIZE)
+active_alerts = ActiveAlertCache()
+alert_hub = AlertHub(STREAM_QUEUE_SIZE)
+background_tasks = set()
+event_loop = None
+# Identifier -> monotonic time of its last reload, oldest first; only touched on the event loop
+recent_refreshes = OrderedDict()
+
+
+async def resync_cache():
+    alert_hub.publish(active_alerts.load(await get_all_active_events()))
+    logging.info(f"[CACHE] Loaded {active_alerts.stats()['alerts']} active alerts")
+
+
+async def refresh_document(identifier: str):
+    now = time.monotonic()
+    while recent_refreshes and now - next(iter(recent_refreshes.values())) >= CACHE_REFRESH_MERGE_SECONDS:
+        recent_refreshes.popitem(last=False)
+
+    # arso-sync sends one event per info of a document, all committed together with
+    # the rows, so the first reload of a burst already saw every row of the document
+    if identifier in recent_refreshes:
+        return
+
+    rows = await get_active_events_by_identifier(identifier)
+    recent_refreshes[identifier] = now
+    alert_hub.publish(active_alerts.upsert(rows))
+
+
+def run_on_event_loop(coro):
+    """Run ``coro`` on the app's event loop from the consumer thread and wait for it."""
+    return asyncio.run_coroutine_threadsafe(coro, event_loop).result()
+
+
+def handle_arso_event(event: dict):
+    # The event only signals a new document; reload all its languages from the database
+    identifier = event.get("identifier")
+    if identifier:
+        run_on_event_loop(refresh_document(identifier))
+
+
+async def cache_maintenance_loop():
+    last_resync = time.monotonic()
+    while True:
+        await asyncio.sleep(CACHE_EVICT_SECONDS)
+        active_alerts.evict_expired()
+
+        # Safety net for events missed between reconnects, and retries a failed warm-up
+        if not active_alerts.ready or time.monotonic() - last_resync >= CACHE_RESYNC_SECONDS:
+            try:
+                await resync_cache()
+                last_resync = time.monotonic()
+            except Exception as e:
+                logging.error(f"[CACHE] Resync failed: {e}")
+
+
+@app.on_event("startup")
+async def startup():
+    global event_loop
+
+    event_loop = asyncio.get_running_loop()
+    # Not fatal: the pool is opened on first use and the maintenance loop retries the warm-up
+    try:
+        await open_pool()
+        await resync_cache()
+    except Exception as e:
+        logging.warning(f"[CACHE] Warm-up failed, serving from the database for now: {e}")
+
+    start_consumer(handle_arso_event, on_connected_callback=lambda: run_on_event_loop(resync_cache()))
+    task = asyncio.create_task(cache_maintenance_loop())
+    background_tasks.add(task)
+
+def parse_fields(fields: Optional[str], summary: bool) -> Optional[tuple]:
+    """Columns requested via ``fields=`` or ``summary``; None means every column."""
+    if summary:
+        return SUMMARY_FIELDS
+    if not fields:
+        return None
+
+    requested = tuple(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+    unknown = [f for f in requested if f not in EVENT_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400,
+                            detail=f"Unknown fields {unknown}, expected any of {list(EVENT_FIELDS)}")
+    return requested or None
+
+
+def project(rows: list, fields: Optional[tuple]) -> list:
+    if fields is None:
+        return rows
+    return [{field: row[field] for field in fields} for row in rows]
+
+
+def events_etag(areas: list, rows: list, fields: Optional[tuple] = None) -> str:
+    """Weak version token of an active-event result: area set, projection, row count and newest row."""
+    newest = max(((row["created_at"], row["id"]) for row in rows), default=(None, None))
+    token = f"{sorted({a.lower() for a in areas})}|{fields}|{len(rows)}|{newest[0]}|{newest[1]}"
+    return 'W/"' + hashlib.sha1(token.encode("utf-8")).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or etag.removeprefix("W/") in candidates
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    for task in background_tasks:
+        task.cancel()
+    await close_pool()
 
 @app.get("/health")
-def health():
+async def health():
     return {"status": "ok"}
 
+@app.get("/metrics")
+async def metrics():
+    return {"db_pool": pool_stats(), "cache": active_alerts.stats(), "streams": alert_hub.stats()}
+
+async def load_active_events(areas: list, selected: Optional[tuple]) -> list:
+    """Active alerts for ``areas`` from the cache, or from the database until it is warm."""
+    if active_alerts.ready:
+        return active_alerts.get(areas)
+
+    include_texts = selected is None or not TEXT_FIELDS.isdisjoint(selected)
+    try:
+        return await get_active_events(areas, include_texts=include_texts)
+    except PoolTimeout as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        # Answered without ETag/Cache-Control so nobody keeps the failure as an empty result
+        logging.error(f"Error retrieving events: {e}")
+        raise HTTPException(status_code=503, detail="Active alerts are temporarily unavailable")
+
 @app.get("/events/active")
-def api_get_active_events(organization_name: str, areas: str):
+async def api_get_active_events(organization_name: str, areas: str, fields: Optional[str] = None,
+                                summary: bool = False, if_none_match: Optional[str] = Header(None)):
+    areas_list = [a.strip() for a in areas.split(",") if a.strip()]
+    selected = parse_fields(fields, summary)
+    rows = await load_active_events(areas_list, selected)
+
+    etag = events_etag(areas_list, rows, selected)
+    headers = {"ETag": etag, "Cache-Control": EVENTS_CACHE_CONTROL}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    # Rendered by orjson directly, skipping FastAPI's jsonable_encoder pass
+    return ORJSONResponse(project(rows, selected), headers=headers)
+
+@app.post("/events/active/batch")
+async def api_get_active_events_batch(payload: dict):
+    """Active events for many area sets at once.
+
+    ``area_sets`` is either a list of area lists or an object mapping caller keys
+    (e.g. user ids) to area lists. All areas are looked up together and every
+    event is returned once, grouped by normalized area; ``area_sets`` in the
+    response maps each key to its normalized areas.
+    """
+    area_sets = payload.get("area_sets")
+    if isinstance(area_sets, list):
+        area_sets = {str(i): areas for i, areas in enumerate(area_sets)}
+    if not isinstance(area_sets, dict) or not all(isinstance(v, list) for v in area_sets.values()):
+        raise HTTPException(status_code=400, detail="area_sets must be a list or an object of area lists")
+
+    fields = payload.get("fields")
+    if isinstance(fields, list):
+        fields = ",".join(fields)
+    selected = parse_fields(fields, bool(payload.get("summary")))
+
+    normalized_sets = {
+        key: list(dict.fromkeys(area_key(a) for a in areas if isinstance(a, str) and a.strip()))
+        for key, areas in area_sets.items()
+    }
+    all_areas = list(dict.fromkeys(a for areas in normalized_sets.values() for a in areas))
+    if len(all_areas) > BATCH_MAX_AREAS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_AREAS} distinct areas per batch")
+
+    grouped = {area: [] for area in all_areas}
+    if all_areas:
+        rows = await load_active_events(all_areas, selected)
+        for row, projected in zip(rows, project(rows, selected)):
+            grouped.setdefault(area_key(row["area"]), []).append(projected)
+
+    return ORJSONResponse({"areas": grouped, "area_sets": normalized_sets})
+
+def sse_message(row: dict, selected: Optional[tuple]) -> bytes:
+    return b"id: %d\nevent: alert\ndata: %s\n\n" % (row["id"], orjson.dumps(project([row], selected)[0]))
+
+async def stream_events(areas: list, backlog: list, selected: Optional[tuple]):
+    subscription = alert_hub.subscribe(areas)
+    try:
+        yield b"retry: 5000\n\n"
+        for row in backlog:
+            yield sse_message(row, selected)
+
+        # A lagged subscription gets no more rows; end once drained so the client reconnects
+        while not (subscription.lagged and subscription.queue.empty()):
+            try:
+                row = await asyncio.wait_for(subscription.queue.get(), STREAM_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield b": keepalive\n\n"
+                continue
+            yield sse_message(row, selected)
+    finally:
+        alert_hub.unsubscribe(subscription)
+
+@app.get("/events/stream")
+async def api_stream_events(areas: str, fields: Optional[str] = None, summary: bool = False,
+                            last_event_id: Optional[str] = Header(None)):
+    """Server-sent events carrying every new alert for ``areas`` as arso-sync publishes it.
+
+    Event ids are alert ids; on reconnect, active alerts newer than Last-Event-ID
+    are replayed from the cache first.
+    """
     areas_list = [a.strip() for a in areas.split(",") if a.strip()]
-    return get_active_events(areas_list)
+    if not areas_list:
+        raise HTTPException(status_code=400, detail="At least one area is required")
+    if alert_hub.subscribers >= STREAM_MAX_SUBSCRIBERS:
+        raise HTTPException(status_code=503, detail="Too many open streams")
+    selected = parse_fields(fields, summary)
+
+    backlog = []
+    if last_event_id and last_event_id.isdigit() and active_alerts.ready:
+        last_id = int(last_event_id)
+        backlog = sorted((row for row in active_alerts.get(areas_list) if row["id"] > last_id),
+                         key=lambda row: row["id"])
+
+    return StreamingResponse(
+        stream_events(areas_list, backlog, selected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def as_utc(value: datetime) -> datetime:
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+def encode_cursor(row: dict) -> str:
+    token = f"{row['onset'].isoformat()}|{row['id']}"
+    return base64.urlsafe_b64encode(token.encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        onset, row_id = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").split("|")
+        return datetime.fromisoformat(onset), int(row_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+@app.get("/events/history")
+async def api_get_alert_history(start: datetime, end: Optional[datetime] = None, area: Optional[str] = None,
+                                severity: Optional[str] = None, event: Optional[str] = None,
+                                language: Optional[str] = None, cursor: Optional[str] = None,
+                                limit: int = Query(100, ge=1, le=1000), fields: Optional[str] = None,
+                                summary: bool = False):
+    """Past and current alerts with onset in [start, end), newest first.
+
+    Pass the returned ``next`` value as ``cursor`` to get the following page.
+    """
+    selected = parse_fields(fields, summary)
+    include_texts = selected is None or not TEXT_FIELDS.isdisjoint(selected)
+    try:
+        rows = await get_alert_history(
+            as_utc(start), as_utc(end) if end else datetime.now(timezone.utc),
+            area=area, severity=severity, event=event, language=language,
+            after=decode_cursor(cursor) if cursor else None, limit=limit, include_texts=include_texts
+        )
+    except PoolTimeout as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    next_cursor = encode_cursor(rows[-1]) if len(rows) == limit else None
+    return ORJSONResponse({"items": project(rows, selected), "next": next_cursor})
+
+@app.get("/events/history/stats")
+async def api_get_alert_daily_stats(start: date, end: Optional[date] = None, area: Optional[str] = None,
+                                    severity: Optional[str] = None, event: Optional[str] = None,
+                                    language: Optional[str] = None):
+    """Alert counts per day, area, severity, event type and language for days in [start, end]."""
+    try:
+        rows = await get_alert_daily_stats(start, end or datetime.now(timezone.utc).date(), area=area,
+                                           severity=severity, event=event, language=language)
+    except PoolTimeout as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return ORJSONResponse(rows)
 
 
 if __name__ == "__main__":
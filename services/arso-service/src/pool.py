@@ -0,0 +1,86 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+import asyncpg
+
+
+class PoolTimeout(Exception):
+    """No connection became free within the acquire timeout."""
+
+
+class PoolUnavailable(PoolTimeout):
+    """The pool could not be opened because the database is unreachable."""
+
+
+class ConnectionPool:
+    """asyncpg pool with an acquire timeout and metrics.
+
+    Callers wait up to ``acquire_timeout`` seconds for a free connection. asyncpg
+    closes connections that sat idle for longer than ``max_idle`` seconds, so one
+    that silently died while idle is reopened instead of handed out. Every
+    statement is prepared once per connection by asyncpg's statement cache.
+    """
+
+    def __init__(self, minconn: int, maxconn: int, acquire_timeout: float,
+                 max_idle: float, **connect_kwargs):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.acquire_timeout = acquire_timeout
+        self.max_idle = max_idle
+        self.connect_kwargs = connect_kwargs
+        self._pool = None
+        self._in_use = 0
+        self._stats = {
+            "acquired": 0,
+            "timeouts": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+        }
+
+    async def open(self):
+        try:
+            self._pool = await asyncpg.create_pool(
+                min_size=self.minconn,
+                max_size=self.maxconn,
+                max_inactive_connection_lifetime=self.max_idle,
+                timeout=self.acquire_timeout,
+                **self.connect_kwargs
+            )
+        except (OSError, asyncio.TimeoutError, asyncpg.PostgresError) as e:
+            raise PoolUnavailable(f"Cannot open database pool: {e}")
+
+    @asynccontextmanager
+    async def connection(self):
+        started = time.monotonic()
+        try:
+            conn = await self._pool.acquire(timeout=self.acquire_timeout)
+        except asyncio.TimeoutError:
+            self._stats["timeouts"] += 1
+            raise PoolTimeout(f"No database connection available within {self.acquire_timeout}s")
+
+        waited = time.monotonic() - started
+        self._in_use += 1
+        self._stats["acquired"] += 1
+        self._stats["wait_seconds_total"] += waited
+        self._stats["wait_seconds_max"] = max(self._stats["wait_seconds_max"], waited)
+        try:
+            yield conn
+        finally:
+            self._in_use -= 1
+            await self._pool.release(conn)
+
+    def stats(self) -> dict:
+        stats = dict(self._stats)
+        open_connections = self._pool.get_size() if self._pool is not None else 0
+        return {
+            "max_size": self.maxconn,
+            "in_use": self._in_use,
+            "idle": max(open_connections - self._in_use, 0),
+            **stats,
+            "wait_seconds_avg": stats["wait_seconds_total"] / stats["acquired"] if stats["acquired"] else 0.0,
+        }
+
+    async def close(self):
+        if self._pool is not None:
+            await self._pool.close()
@@ -0,0 +1,98 @@
+"""Parse benchmark over recorded ARSO CAP fixtures.
+
+Compares the streaming parser in cap_parser with a full ElementTree parse of the
+same documents and reports records/second and peak traced memory for each.
+
+    python bench/bench_parse.py                 # fixtures as recorded
+    python bench/bench_parse.py --scale 200     # each document inflated to 200x its info blocks
+"""
+import argparse
+import glob
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from cap_parser import CAP_NS, INFO_TAG, iter_alert_records  # noqa: E402
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def inflate(path: str, scale: int, out_dir: str) -> str:
+    """Write a copy of ``path`` whose cap:info blocks are repeated ``scale`` times."""
+    if scale <= 1:
+        return path
+
+    tree = ET.parse(path)
+    root = tree.getroot()
+    infos = root.findall(INFO_TAG)
+    for _ in range(scale - 1):
+        root.extend(infos)
+
+    ET.register_namespace("", CAP_NS.strip("{}"))
+    out_path = os.path.join(out_dir, os.path.basename(path))
+    tree.write(out_path, encoding="utf-8", xml_declaration=True)
+    return out_path
+
+
+def parse_streaming(path: str) -> int:
+    count = 0
+    for _ in iter_alert_records(path):
+        count += 1
+    return count
+
+
+def parse_tree(path: str) -> int:
+    # Baseline: the whole document in memory and one find() per field
+    ns = {"cap": CAP_NS.strip("{}")}
+    root = ET.parse(path).getroot()
+    count = 0
+    for info in root.findall("cap:info", ns):
+        for field in ("language", "severity", "urgency", "effective", "onset", "expires",
+                      "certainty", "headline", "description", "instruction"):
+            info.find(f"cap:{field}", ns)
+        for param in info.findall("cap:parameter", ns):
+            param.find("cap:valueName", ns)
+        count += 1
+    return count
+
+
+def run(name: str, parse, paths: list, repeat: int):
+    tracemalloc.start()
+    start = time.perf_counter()
+    records = 0
+    for _ in range(repeat):
+        for path in paths:
+            records += parse(path)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{name:<10} records={records:<8} time={elapsed:.3f}s "
+          f"rate={records / elapsed:,.0f} rec/s peak_mem={peak / 1024:,.0f} KiB")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--fixtures", default=FIXTURES_DIR)
+    arg_parser.add_argument("--repeat", type=int, default=50)
+    arg_parser.add_argument("--scale", type=int, default=1)
+    args = arg_parser.parse_args()
+
+    sources = sorted(glob.glob(os.path.join(args.fixtures, "*.xml")))
+    if not sources:
+        sys.exit(f"No fixtures found in {args.fixtures}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = [inflate(path, args.scale, tmp) for path in sources]
+        print(f"{len(paths)} documents, scale={args.scale}, repeat={args.repeat}")
+        run("streaming", parse_streaming, paths, args.repeat)
+        run("tree", parse_tree, paths, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
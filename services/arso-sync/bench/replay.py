@@ -0,0 +1,168 @@
+"""Offline replay of the arso-sync pipeline.
+
+Serves recorded CAP files from a local directory in place of meteo.arso.gov.si
+and runs fetch -> main.parse_warning_data (parse and insert) -> publish against
+the Postgres configured by the usual DB_* variables, with an in-memory stand-in
+for RabbitMQ. Reports per-stage latency (fetch is the wall time for all feeds of
+one pass), alerts/second, the latest severe expiry and the languages that were
+published, so regressions in the production code path show up here. Point it at a scratch database: the outbox drain also marks any
+pending real events as published.
+
+Every iteration rewrites the CAP identifiers (suffix ``.replay-<run>-<n>``) so each
+pass is a fresh ingest rather than a stream of ON CONFLICT no-ops.
+
+    DB_HOST=localhost DB_NAME=arso python bench/replay.py --iterations 20 --cleanup
+"""
+import argparse
+import os
+import re
+import statistics
+import sys
+import threading
+import time
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+IDENTIFIER_RE = re.compile(rb"(<identifier>)([^<]+)(</identifier>)")
+
+
+class ReplayHandler(SimpleHTTPRequestHandler):
+    """Serves fixture files with the CAP identifier tagged by the current replay pass."""
+    suffix = b""
+
+    def do_GET(self):
+        path = self.translate_path(self.path)
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return
+
+        with open(path, "rb") as f:
+            body = IDENTIFIER_RE.sub(rb"\1\2" + ReplayHandler.suffix + rb"\3", f.read(), count=1)
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/xml")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MemoryPublisher:
+    """Stand-in for publisher.publish_batch that only keeps what would have been sent."""
+
+    def __init__(self):
+        self.events = []
+
+    def publish_batch(self, events: list) -> list:
+        self.events.extend(events)
+        return [True] * len(events)
+
+
+def start_server(directory: str) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(ReplayHandler, directory=directory))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def report(stage: str, samples: list):
+    if not samples:
+        return
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    print(f"{stage:<8} n={len(samples):<5} avg={statistics.mean(samples) * 1000:8.2f}ms "
+          f"p95={p95 * 1000:8.2f}ms max={ordered[-1] * 1000:8.2f}ms")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--fixtures", default=FIXTURES_DIR)
+    arg_parser.add_argument("--iterations", type=int, default=10)
+    arg_parser.add_argument("--cleanup", action="store_true", help="delete replayed rows afterwards")
+    args = arg_parser.parse_args()
+
+    server = start_server(args.fixtures)
+    host, port = server.server_address
+    os.environ["ARSO_BASE_URL"] = f"http://{host}:{port}/warning_SLOVENIA_{{queried_location}}_latest_CAP.xml"
+
+    # Imported only now so fetcher picks up the local BASE_URL
+    sys.path.insert(0, SRC_DIR)
+    from cap_parser import read_alert_header
+    from db import STATS_DAY_SQL, create_tables, drain_outbox, get_connection, release_connection
+    from fetcher import fetch_all_locations
+    from main import LOCATIONS_ARRAY, PUBLISH_LANGUAGES, parse_warning_data
+
+    create_tables()
+    publisher = MemoryPublisher()
+    run_tag = f".replay-{int(time.time())}"
+    timings = {"fetch": [], "ingest": [], "publish": []}
+    records_total = 0
+    inserted_total = 0
+    severe_until = None
+
+    started = time.perf_counter()
+    for iteration in range(args.iterations):
+        ReplayHandler.suffix = f"{run_tag}-{iteration}".encode()
+
+        t = time.perf_counter()
+        responses = list(fetch_all_locations(LOCATIONS_ARRAY))
+        timings["fetch"].append(time.perf_counter() - t)
+
+        for location, response in responses:
+            header = read_alert_header(response["content"])
+            document = (location, header["identifier"], header["sent"])
+
+            t = time.perf_counter()
+            result = parse_warning_data(response["content"], document)
+            timings["ingest"].append(time.perf_counter() - t)
+
+            records_total += result.get("records", 0)
+            inserted_total += result.get("inserted", 0)
+            if result.get("severe_until") and (severe_until is None or result["severe_until"] > severe_until):
+                severe_until = result["severe_until"]
+
+        t = time.perf_counter()
+        drain_outbox(publisher.publish_batch)
+        timings["publish"].append(time.perf_counter() - t)
+
+    elapsed = time.perf_counter() - started
+    server.shutdown()
+
+    print(f"{args.iterations} iterations x {len(LOCATIONS_ARRAY)} feeds in {elapsed:.2f}s")
+    for stage, samples in timings.items():
+        report(stage, samples)
+    print(f"records parsed={records_total} inserted={inserted_total} published={len(publisher.events)}")
+    print(f"throughput: {inserted_total / elapsed:,.0f} alerts/s")
+    print(f"latest severe expiry: {severe_until}")
+
+    languages = {event.get("language") for event in publisher.events}
+    print(f"published languages: {sorted(languages, key=str)}")
+    if not languages <= set(PUBLISH_LANGUAGES):
+        print(f"WARNING: published languages other than {PUBLISH_LANGUAGES}")
+
+    if args.cleanup:
+        conn = get_connection()
+        cursor = conn.cursor()
+        pattern = f"%{run_tag}-%"
+        cursor.execute(f"""
+            UPDATE alert_daily_stats s SET alerts = s.alerts - r.alerts
+            FROM (SELECT {STATS_DAY_SQL} AS day, area_key, severity, event, language, COUNT(*) AS alerts
+                  FROM alert_info WHERE alert_identifier LIKE %s GROUP BY 1, 2, 3, 4, 5) r
+            WHERE s.day = r.day AND s.area_key IS NOT DISTINCT FROM r.area_key
+              AND s.severity IS NOT DISTINCT FROM r.severity AND s.event IS NOT DISTINCT FROM r.event
+              AND s.language IS NOT DISTINCT FROM r.language
+        """, (pattern,))
+        cursor.execute("DELETE FROM alert_info WHERE alert_identifier LIKE %s", (pattern,))
+        cursor.execute("DELETE FROM cap_documents WHERE identifier LIKE %s", (pattern,))
+        cursor.execute("DELETE FROM event_outbox WHERE payload->>'identifier' LIKE %s", (pattern,))
+        conn.commit()
+        cursor.close()
+        release_connection(conn)
+        print("Replayed rows removed")
+
+
+if __name__ == "__main__":
+    main()
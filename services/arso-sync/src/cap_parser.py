@@ -0,0 +1,115 @@
+import io
+import xml.etree.ElementTree as ET
+from typing import NamedTuple, Optional
+
+CAP_NS = "{urn:oasis:names:tc:emergency:cap:1.2}"
+
+INFO_TAG = CAP_NS + "info"
+PARAMETER_TAG = CAP_NS + "parameter"
+VALUE_NAME_TAG = CAP_NS + "valueName"
+VALUE_TAG = CAP_NS + "value"
+
+HEADER_FIELDS = {CAP_NS + name: name for name in ("identifier", "sender", "sent", "status")}
+INFO_FIELDS = {
+    CAP_NS + name: name
+    for name in ("language", "severity", "urgency", "effective", "onset", "expires",
+                 "certainty", "headline", "description", "instruction")
+}
+
+
+class AlertRecord(NamedTuple):
+    """One cap:info block flattened into the columns stored in alert_info."""
+    identifier: str
+    language: Optional[str]
+    event: str
+    effective: Optional[str]
+    onset: Optional[str]
+    expires: Optional[str]
+    severity: Optional[str]
+    urgency: Optional[str]
+    certainty: Optional[str]
+    headline: Optional[str]
+    description: Optional[str]
+    instruction: Optional[str]
+    area: Optional[str]
+
+
+def extract_area_from_headline(headline: str) -> str:
+    if not headline or "/" not in headline:
+        return None
+    return headline.split("/")[-1].strip()
+
+
+def _as_source(data):
+    """Accept raw bytes/str, a path or an open binary file."""
+    if isinstance(data, bytes):
+        return io.BytesIO(data)
+    if isinstance(data, str) and data.lstrip().startswith("<"):
+        return io.BytesIO(data.encode("utf-8"))
+    return data
+
+
+def read_alert_header(data) -> dict:
+    """Read only the CAP identifier and sent timestamp, stopping before any cap:info."""
+    header = {}
+    for event, elem in ET.iterparse(_as_source(data), events=("start", "end")):
+        if event == "start":
+            if elem.tag == INFO_TAG:
+                break
+            continue
+
+        name = HEADER_FIELDS.get(elem.tag)
+        if name in ("identifier", "sent"):
+            header[name] = elem.text
+            if len(header) == 2:
+                break
+    return header
+
+
+def _record_from_info(info: ET.Element, identifier: str) -> AlertRecord:
+    # Single pass over the children instead of one find() per field
+    fields = dict.fromkeys(INFO_FIELDS.values())
+    event = "Unknown"
+
+    for child in info:
+        if child.tag == PARAMETER_TAG:
+            if child.findtext(VALUE_NAME_TAG) == "awareness_type":
+                event = child.findtext(VALUE_TAG)
+            continue
+
+        name = INFO_FIELDS.get(child.tag)
+        if name:
+            fields[name] = child.text
+
+    return AlertRecord(
+        identifier=identifier,
+        event=event,
+        area=extract_area_from_headline(fields["headline"]),
+        **fields,
+    )
+
+
+def iter_alert_records(data, header: dict = None):
+    """Stream a CAP document and yield one AlertRecord per cap:info.
+
+    ``data`` may be bytes, an XML string, a path or a binary file object. Each
+    info block is released as soon as its record is built, so memory stays flat
+    regardless of how many blocks the document holds. The alert header fields
+    are collected into ``header`` if a dict is passed in.
+    """
+    header = {} if header is None else header
+    context = ET.iterparse(_as_source(data), events=("start", "end"))
+    _, root = next(context)
+    depth = 0
+
+    for event, elem in context:
+        if event == "start":
+            depth += 1
+            continue
+
+        depth -= 1
+        if elem.tag == INFO_TAG:
+            yield _record_from_info(elem, header.get("identifier"))
+            root.clear()
+        elif depth == 0 and elem.tag in HEADER_FIELDS:
+            header[HEADER_FIELDS[elem.tag]] = elem.text
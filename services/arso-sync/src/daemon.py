@@ -0,0 +1,165 @@
+import json
+import os
+import signal
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from db import use_persistent_connection
+from publisher import idle
+
+POLL_MIN_INTERVAL = float(os.getenv("POLL_MIN_INTERVAL", "60"))
+POLL_MAX_INTERVAL = float(os.getenv("POLL_MAX_INTERVAL", "900"))
+POLL_SEVERE_INTERVAL = float(os.getenv("POLL_SEVERE_INTERVAL", "120"))
+POLL_BACKOFF = float(os.getenv("POLL_BACKOFF", "2"))
+METRICS_PORT = int(os.getenv("METRICS_PORT", "8000"))
+MAINTENANCE_INTERVAL = float(os.getenv("MAINTENANCE_INTERVAL", "3600"))
+
+stop_event = threading.Event()
+metrics_lock = threading.Lock()
+metrics = {
+    "started_at": None,
+    "polls": 0,
+    "poll_errors": 0,
+    "feeds_processed": 0,
+    "feeds_not_modified": 0,
+    "feeds_unchanged": 0,
+    "alerts_inserted": 0,
+    "events_published": 0,
+    "last_poll_at": None,
+    "last_success_at": None,
+    "last_poll_seconds": None,
+    "next_interval_seconds": None,
+    "severe_until": None,
+}
+
+
+def next_interval(previous: float, cycle: dict, severe_until: datetime) -> float:
+    """Pick the wait before the next poll.
+
+    A changed feed resets to the fastest interval and every idle poll backs off
+    towards the slowest one. While a Severe/Extreme alert is still in force the
+    interval never exceeds POLL_SEVERE_INTERVAL.
+    """
+    if cycle and cycle["processed"]:
+        interval = POLL_MIN_INTERVAL
+    else:
+        interval = min(previous * POLL_BACKOFF, POLL_MAX_INTERVAL)
+
+    if severe_until and severe_until > datetime.now(timezone.utc):
+        interval = min(interval, POLL_SEVERE_INTERVAL)
+
+    return max(interval, POLL_MIN_INTERVAL)
+
+
+def is_healthy() -> bool:
+    # Unhealthy once no poll has succeeded for two slow intervals
+    with metrics_lock:
+        reference = metrics["last_success_at"] or metrics["started_at"]
+    if reference is None:
+        return True
+    return time.time() - reference < 2 * POLL_MAX_INTERVAL + 60
+
+
+class HealthHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/health":
+            healthy = is_healthy()
+            self._send(200 if healthy else 503, {"status": "ok" if healthy else "stale"})
+        elif self.path == "/metrics":
+            with metrics_lock:
+                snapshot = dict(metrics)
+            self._send(200, snapshot)
+        else:
+            self._send(404, {"detail": "Not Found"})
+
+    def _send(self, status: int, body: dict):
+        payload = json.dumps(body, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_health_server() -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("0.0.0.0", METRICS_PORT), HealthHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    print(f"Health and metrics endpoint listening on :{METRICS_PORT}")
+    return server
+
+
+def record_cycle(cycle: dict, started: float, interval: float, severe_until: datetime):
+    with metrics_lock:
+        metrics["polls"] += 1
+        metrics["last_poll_at"] = started
+        metrics["last_poll_seconds"] = round(time.time() - started, 3)
+        metrics["next_interval_seconds"] = interval
+        metrics["severe_until"] = severe_until.isoformat() if severe_until else None
+        if cycle is None:
+            metrics["poll_errors"] += 1
+            return
+        metrics["last_success_at"] = time.time()
+        metrics["feeds_processed"] += cycle["processed"]
+        metrics["feeds_not_modified"] += cycle["not_modified"]
+        metrics["feeds_unchanged"] += cycle["unchanged"]
+        metrics["alerts_inserted"] += cycle["inserted"]
+        metrics["events_published"] += cycle["published"]
+
+
+def wait(seconds: float):
+    deadline = time.monotonic() + seconds
+    while not stop_event.is_set():
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        idle(min(remaining, 1.0))
+
+
+def run_daemon(poll_once, maintenance=None):
+    """Poll ARSO on an adaptive schedule until SIGTERM/SIGINT, keeping connections warm.
+
+    ``maintenance`` is called once at start and then every MAINTENANCE_INTERVAL seconds.
+    """
+    signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+    signal.signal(signal.SIGINT, lambda *_: stop_event.set())
+
+    use_persistent_connection()
+    with metrics_lock:
+        metrics["started_at"] = time.time()
+    server = start_health_server()
+
+    interval = POLL_MIN_INTERVAL
+    severe_until = None
+    last_maintenance = None
+
+    while not stop_event.is_set():
+        started = time.time()
+        if maintenance and (last_maintenance is None or started - last_maintenance >= MAINTENANCE_INTERVAL):
+            try:
+                maintenance()
+                last_maintenance = started
+            except Exception as e:
+                print(f"Maintenance failed: {e}")
+
+        try:
+            cycle = poll_once()
+        except Exception as e:
+            print(f"Poll failed: {e}")
+            cycle = None
+
+        if cycle and cycle["severe_until"] and (severe_until is None or cycle["severe_until"] > severe_until):
+            severe_until = cycle["severe_until"]
+
+        interval = next_interval(interval, cycle, severe_until)
+        record_cycle(cycle, started, interval, severe_until)
+        print(f"Next poll in {interval:.0f}s")
+        wait(interval)
+
+    server.shutdown()
+    print("Daemon stopped")
@@ -1,5 +1,9 @@
+import hashlib
+from datetime import datetime, timedelta, timezone
+
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2 import sql
+from psycopg2.extras import Json, RealDictCursor, execute_values
 import os
 
 DATABASE_CONFIG = {
@@ -10,9 +14,219 @@ DATABASE_CONFIG = {
     'password': os.getenv('DB_PASSWORD', 'QJpwX53lar404!')
 }
 
+ALERT_PARTITIONS_AHEAD = int(os.getenv('ALERT_PARTITIONS_AHEAD', '3'))
+ALERT_RETENTION_DAYS = int(os.getenv('ALERT_RETENTION_DAYS', '90'))
+OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', '100'))
+OUTBOX_RETENTION_HOURS = int(os.getenv('OUTBOX_RETENTION_HOURS', '24'))
+
+connection = None
+persistent = False
+
+
+def use_persistent_connection(enabled: bool = True):
+    """Keep one connection open across calls (daemon mode) instead of one per call."""
+    global persistent
+    persistent = enabled
+
+
 def get_connection():
-    """Create and return a database connection."""
-    return psycopg2.connect(**DATABASE_CONFIG)
+    """Create and return a database connection.
+
+    In persistent mode the same connection is returned until it breaks.
+    """
+    global connection
+
+    if not persistent:
+        return psycopg2.connect(**DATABASE_CONFIG)
+
+    if connection is None or connection.closed:
+        connection = psycopg2.connect(**DATABASE_CONFIG)
+    return connection
+
+
+def release_connection(conn):
+    """Give a connection back: close it, or just end its transaction if it is the persistent one."""
+    if conn is not connection:
+        conn.close()
+    elif not conn.closed:
+        conn.rollback()
+
+
+ALERT_INFO_DDL = """
+    CREATE TABLE IF NOT EXISTS {}
+    (
+        id BIGSERIAL,
+        alert_identifier TEXT,
+        language TEXT,
+        event TEXT,
+        effective TIMESTAMPTZ,
+        onset TIMESTAMPTZ,
+        expires TIMESTAMPTZ NOT NULL,
+        severity TEXT,
+        urgency TEXT,
+        certainty TEXT,
+        headline TEXT,
+        description_hash TEXT,
+        instruction_hash TEXT,
+        created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+        area TEXT,
+        area_key TEXT GENERATED ALWAYS AS (LOWER(area)) STORED,
+        PRIMARY KEY (id, expires),
+        UNIQUE (alert_identifier, language, event, onset, expires)
+    ) PARTITION BY RANGE (expires)
+"""
+
+# Columns copied when rows move between tables (generated columns excluded)
+ALERT_INFO_COLUMNS = (
+    "id", "alert_identifier", "language", "event", "effective", "onset", "expires",
+    "severity", "urgency", "certainty", "headline", "description_hash", "instruction_hash",
+    "created_at", "area",
+)
+
+# Day bucket of an alert in alert_daily_stats
+STATS_DAY_SQL = "(COALESCE(onset, effective, expires) AT TIME ZONE 'UTC')::date"
+
+# Same digest as text_hash(), computed in SQL for migrations
+TEXT_HASH_SQL = "encode(sha256(convert_to({}, 'UTF8')), 'hex')"
+
+
+def text_hash(text: str) -> str:
+    """Content address of a description/instruction text in alert_text."""
+    if text is None:
+        return None
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def move_texts_to_alert_text(cursor, table: str):
+    """Replace inline description/instruction columns of ``table`` with alert_text references."""
+    for column in ("description", "instruction"):
+        cursor.execute("""
+                       SELECT 1 FROM information_schema.columns
+                       WHERE table_schema = current_schema() AND table_name = %s AND column_name = %s
+                       """, (table, column))
+        if cursor.fetchone() is None:
+            continue
+
+        print(f"Moving {table}.{column} to alert_text...")
+        values = {
+            "table": sql.Identifier(table),
+            "column": sql.Identifier(column),
+            "hash_column": sql.Identifier(f"{column}_hash"),
+            "hash": sql.SQL(TEXT_HASH_SQL).format(sql.Identifier(column)),
+        }
+        cursor.execute(sql.SQL("ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {hash_column} TEXT").format(**values))
+        cursor.execute(sql.SQL("""
+                       INSERT INTO alert_text (hash, body)
+                       SELECT DISTINCT {hash}, {column} FROM {table} WHERE {column} IS NOT NULL
+                       ON CONFLICT (hash) DO NOTHING
+                       """).format(**values))
+        cursor.execute(sql.SQL("UPDATE {table} SET {hash_column} = {hash} WHERE {column} IS NOT NULL").format(**values))
+        cursor.execute(sql.SQL("ALTER TABLE {table} DROP COLUMN {column}").format(**values))
+
+
+def month_start(value: datetime) -> datetime:
+    value = value.astimezone(timezone.utc)
+    return datetime(value.year, value.month, 1, tzinfo=timezone.utc)
+
+
+def add_months(month: datetime, months: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def partition_name(table: str, month: datetime) -> str:
+    return f"{table}_p{month:%Y%m}"
+
+
+def create_partition(cursor, month: datetime):
+    """Create the monthly alert_info partition starting at ``month`` if it is missing.
+
+    Rows that already landed in the default partition for that month are moved
+    into the new partition, otherwise Postgres would refuse to create it.
+    """
+    name = partition_name("alert_info", month)
+    cursor.execute("SELECT to_regclass(%s)", (name,))
+    if cursor.fetchone()[0] is not None:
+        return
+
+    upper = add_months(month, 1)
+    columns = sql.SQL(", ").join(map(sql.Identifier, ALERT_INFO_COLUMNS))
+
+    cursor.execute("CREATE TEMP TABLE alert_info_moved (LIKE alert_info) ON COMMIT DROP")
+    cursor.execute(sql.SQL("""
+                   WITH moved AS (
+                       DELETE FROM alert_info_default WHERE expires >= %s AND expires < %s
+                       RETURNING {columns}
+                   )
+                   INSERT INTO alert_info_moved ({columns}) SELECT {columns} FROM moved
+                   """).format(columns=columns), (month, upper))
+
+    cursor.execute(sql.SQL("CREATE TABLE {} PARTITION OF alert_info FOR VALUES FROM (%s) TO (%s)").format(
+        sql.Identifier(name)), (month, upper))
+
+    cursor.execute(sql.SQL("INSERT INTO alert_info ({columns}) SELECT {columns} FROM alert_info_moved").format(
+        columns=columns))
+    cursor.execute("DROP TABLE alert_info_moved")
+
+
+def ensure_partitions(cursor):
+    """Make sure partitions exist from last month up to ALERT_PARTITIONS_AHEAD months ahead."""
+    month = month_start(datetime.now(timezone.utc))
+    for offset in range(-1, ALERT_PARTITIONS_AHEAD + 1):
+        create_partition(cursor, add_months(month, offset))
+
+
+def archive_expired_partitions(cursor) -> list:
+    """Move monthly partitions that expired more than ALERT_RETENTION_DAYS ago to alert_info_archive."""
+    cutoff = datetime.now(timezone.utc) - timedelta(days=ALERT_RETENTION_DAYS)
+
+    cursor.execute("""
+                   SELECT child.relname
+                   FROM pg_inherits
+                   JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+                   JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+                   WHERE parent.relname = 'alert_info' AND child.relname ~ '^alert_info_p[0-9]{6}$'
+                   ORDER BY child.relname
+                   """)
+
+    archived = []
+    for (name,) in cursor.fetchall():
+        month = datetime.strptime(name[-6:], "%Y%m").replace(tzinfo=timezone.utc)
+        upper = add_months(month, 1)
+        if upper > cutoff:
+            continue
+
+        cursor.execute(sql.SQL("ALTER TABLE alert_info DETACH PARTITION {}").format(sql.Identifier(name)))
+        cursor.execute(sql.SQL("ALTER TABLE alert_info_archive ATTACH PARTITION {} FOR VALUES FROM (%s) TO (%s)").format(
+            sql.Identifier(name)), (month, upper))
+        archived.append(name)
+
+    return archived
+
+
+def maintain_partitions():
+    """Create upcoming alert_info partitions, archive expired ones and prune old cap_documents."""
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        ensure_partitions(cursor)
+        archived = archive_expired_partitions(cursor)
+        # The processed-document index only needs to cover what ARSO can still serve
+        cursor.execute("""
+                       DELETE FROM cap_documents
+                       WHERE processed_at < NOW() - make_interval(days => %s)
+                       """, (ALERT_RETENTION_DAYS,))
+        conn.commit()
+        if archived:
+            print(f"Archived alert_info partitions: {', '.join(archived)}")
+    except Exception as e:
+        conn.rollback()
+        print(f"Error maintaining alert_info partitions: {e}")
+        raise
+    finally:
+        cursor.close()
+        release_connection(conn)
 
 
 def create_tables():
@@ -22,34 +236,142 @@ def create_tables():
 
     try:
         print("Creating tables...")
+        # Long description/instruction texts are stored once and referenced by hash
         cursor.execute("""
-                       CREATE TABLE IF NOT EXISTS alert_info
+                       CREATE TABLE IF NOT EXISTS alert_text
                        (
-                           id SERIAL PRIMARY KEY,
-                           alert_identifier TEXT,
-                           language TEXT,
-                           event TEXT,
-                           effective TIMESTAMPTZ,
-                           onset TIMESTAMPTZ,
-                           expires TIMESTAMPTZ,
-                           severity TEXT,
-                           urgency TEXT,
-                           certainty TEXT,
-                           headline TEXT,
-                           description TEXT,
-                           instruction TEXT,
-                           created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
-                           area TEXT,
-                           UNIQUE (alert_identifier, language, event, onset)
+                           hash TEXT PRIMARY KEY,
+                           body TEXT NOT NULL
                            );
                        """)
 
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('alert_info')")
+        existing = cursor.fetchone()
+        migrate_legacy = existing is not None and existing[0] == 'r'
+        if migrate_legacy:
+            print("Migrating alert_info to a partitioned table...")
+            cursor.execute("ALTER TABLE alert_info RENAME TO alert_info_legacy")
+            move_texts_to_alert_text(cursor, "alert_info_legacy")
+
+        # alert_info holds the active working set; whole expired months are moved
+        # to the identically shaped alert_info_archive by archive_expired_partitions
+        for table in ("alert_info", "alert_info_archive"):
+            cursor.execute(sql.SQL(ALERT_INFO_DDL).format(sql.Identifier(table)))
+            cursor.execute(sql.SQL("CREATE TABLE IF NOT EXISTS {} PARTITION OF {} DEFAULT").format(
+                sql.Identifier(f"{table}_default"), sql.Identifier(table)))
+            move_texts_to_alert_text(cursor, table)
+            # Normalized area for index lookups from arso-service
+            cursor.execute(sql.SQL("""
+                           ALTER TABLE {} ADD COLUMN IF NOT EXISTS area_key TEXT
+                           GENERATED ALWAYS AS (LOWER(area)) STORED
+                           """).format(sql.Identifier(table)))
+
+        if migrate_legacy:
+            cursor.execute("SELECT MIN(expires), MAX(expires) FROM alert_info_legacy")
+            oldest, newest = cursor.fetchone()
+            if oldest is not None:
+                month = month_start(oldest)
+                while month <= newest:
+                    create_partition(cursor, month)
+                    month = add_months(month, 1)
+
+            columns = sql.SQL(", ").join(map(sql.Identifier, ALERT_INFO_COLUMNS))
+            # Rows without expires cannot be placed in a partition and are never active anyway
+            cursor.execute(sql.SQL("""
+                           INSERT INTO alert_info ({columns})
+                           SELECT {columns} FROM alert_info_legacy WHERE expires IS NOT NULL
+                           """).format(columns=columns))
+            cursor.execute("SELECT setval(pg_get_serial_sequence('alert_info', 'id'), "
+                           "COALESCE((SELECT MAX(id) FROM alert_info_legacy), 0) + 1, false)")
+            cursor.execute("DROP TABLE alert_info_legacy")
+
+        ensure_partitions(cursor)
+
         cursor.execute("""
                         CREATE INDEX IF NOT EXISTS idx_alert_info_alert_identifier ON alert_info(alert_identifier);
                         CREATE INDEX IF NOT EXISTS idx_alert_info_expires ON alert_info(expires);
                         CREATE INDEX IF NOT EXISTS idx_alert_info_event ON alert_info(event);
                         CREATE INDEX IF NOT EXISTS idx_alert_info_language ON alert_info(language);
                         CREATE INDEX IF NOT EXISTS idx_alert_info_created ON alert_info(created_at);
+                        CREATE INDEX IF NOT EXISTS idx_alert_info_area_key_expires ON alert_info(area_key, expires);
+                       """)
+
+        # History queries scan by time; rows arrive roughly in onset order, so
+        # BRIN indexes stay tiny even over years of archived alerts
+        for table in ("alert_info", "alert_info_archive"):
+            for column in ("onset", "created_at"):
+                cursor.execute(sql.SQL("CREATE INDEX IF NOT EXISTS {} ON {} USING brin ({})").format(
+                    sql.Identifier(f"idx_{table}_{column}_brin"), sql.Identifier(table), sql.Identifier(column)))
+
+        columns = sql.SQL(", ").join(map(sql.Identifier, ALERT_INFO_COLUMNS + ("area_key",)))
+        cursor.execute(sql.SQL("""
+                       CREATE OR REPLACE VIEW alert_history AS
+                       SELECT {columns} FROM alert_info
+                       UNION ALL
+                       SELECT {columns} FROM alert_info_archive
+                       """).format(columns=columns))
+
+        # Per-day counts kept up to date by insert_alert_infos for arso-service's stats endpoint
+        cursor.execute("""
+                       CREATE TABLE IF NOT EXISTS alert_daily_stats
+                       (
+                           day DATE NOT NULL,
+                           area_key TEXT,
+                           severity TEXT,
+                           event TEXT,
+                           language TEXT,
+                           alerts BIGINT NOT NULL,
+                           UNIQUE NULLS NOT DISTINCT (day, area_key, severity, event, language)
+                           );
+                       """)
+        cursor.execute("SELECT EXISTS (SELECT 1 FROM alert_daily_stats)")
+        if not cursor.fetchone()[0]:
+            cursor.execute(f"""
+                           INSERT INTO alert_daily_stats (day, area_key, severity, event, language, alerts)
+                           SELECT {STATS_DAY_SQL}, area_key, severity, event, language, COUNT(*)
+                           FROM alert_history
+                           GROUP BY 1, 2, 3, 4, 5
+                           """)
+
+        cursor.execute("""
+                       CREATE TABLE IF NOT EXISTS feed_state
+                       (
+                           location TEXT PRIMARY KEY,
+                           etag TEXT,
+                           last_modified TEXT,
+                           body_digest TEXT,
+                           identifier_digest TEXT,
+                           runs_total BIGINT NOT NULL DEFAULT 0,
+                           runs_not_modified BIGINT NOT NULL DEFAULT 0,
+                           runs_unchanged BIGINT NOT NULL DEFAULT 0,
+                           runs_processed BIGINT NOT NULL DEFAULT 0,
+                           last_checked_at TIMESTAMPTZ,
+                           last_changed_at TIMESTAMPTZ
+                           );
+                       """)
+
+        cursor.execute("""
+                       CREATE TABLE IF NOT EXISTS event_outbox
+                       (
+                           id BIGSERIAL PRIMARY KEY,
+                           payload JSONB NOT NULL,
+                           created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+                           published_at TIMESTAMPTZ,
+                           attempts INTEGER NOT NULL DEFAULT 0,
+                           last_error TEXT
+                           );
+                       CREATE INDEX IF NOT EXISTS idx_event_outbox_pending ON event_outbox(id) WHERE published_at IS NULL;
+                       """)
+
+        cursor.execute("""
+                       CREATE TABLE IF NOT EXISTS cap_documents
+                       (
+                           location TEXT NOT NULL,
+                           identifier TEXT NOT NULL,
+                           sent TEXT NOT NULL,
+                           processed_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+                           PRIMARY KEY (location, identifier, sent)
+                           );
                        """)
 
         conn.commit()
@@ -60,7 +382,247 @@ def create_tables():
         raise
     finally:
         cursor.close()
-        conn.close()
+        release_connection(conn)
+
+
+def get_feed_states() -> dict:
+    """Return the stored conditional-GET and digest state of every feed, keyed by location."""
+    conn = get_connection()
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
+
+    try:
+        cursor.execute("SELECT * FROM feed_state")
+        return {row["location"]: row for row in cursor.fetchall()}
+    finally:
+        cursor.close()
+        release_connection(conn)
+
+
+FEED_OUTCOMES = ("not_modified", "unchanged", "processed")
+
+
+def update_feed_state(location: str, outcome: str, etag: str = None, last_modified: str = None,
+                      body_digest: str = None, identifier_digest: str = None):
+    """Record the outcome of one feed check and bump its run counters.
+
+    Validators and digests are only overwritten when a new value is given, so a
+    304 response keeps the state of the last downloaded body.
+    """
+    if outcome not in FEED_OUTCOMES:
+        raise ValueError(f"Unknown feed outcome: {outcome}")
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute(f"""
+                       INSERT INTO feed_state (location, etag, last_modified, body_digest, identifier_digest,
+                                               runs_total, runs_{outcome}, last_checked_at, last_changed_at)
+                       VALUES (%s, %s, %s, %s, %s, 1, 1, NOW(),
+                               CASE WHEN %s = 'processed' THEN NOW() END)
+                       ON CONFLICT (location) DO UPDATE SET
+                           etag = COALESCE(EXCLUDED.etag, feed_state.etag),
+                           last_modified = COALESCE(EXCLUDED.last_modified, feed_state.last_modified),
+                           body_digest = COALESCE(EXCLUDED.body_digest, feed_state.body_digest),
+                           identifier_digest = COALESCE(EXCLUDED.identifier_digest, feed_state.identifier_digest),
+                           runs_total = feed_state.runs_total + 1,
+                           runs_{outcome} = feed_state.runs_{outcome} + 1,
+                           last_checked_at = NOW(),
+                           last_changed_at = COALESCE(EXCLUDED.last_changed_at, feed_state.last_changed_at);
+                       """, (location, etag, last_modified, body_digest, identifier_digest, outcome))
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"Error updating feed state for {location}: {e}")
+        raise
+    finally:
+        cursor.close()
+        release_connection(conn)
+
+
+def _alert_info_key(alert_identifier, language, event, onset):
+    if isinstance(onset, str):
+        onset = datetime.fromisoformat(onset)
+    return alert_identifier, language, event, onset
+
+
+def is_document_processed(document: tuple) -> bool:
+    """Whether the (location, identifier, sent) CAP document was already ingested."""
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("""
+                       SELECT 1 FROM cap_documents
+                       WHERE location = %s AND identifier = %s AND sent = %s
+                       """, document)
+        return cursor.fetchone() is not None
+    finally:
+        cursor.close()
+        release_connection(conn)
+
+
+def insert_alert_infos(rows: list, outbox_languages: tuple = (), document: tuple = None) -> list:
+    """Insert parsed AlertRecords in one statement and one transaction.
+
+    Newly inserted rows whose language is in ``outbox_languages`` are queued in
+    event_outbox within the same transaction, so an alert is never stored without
+    its event. ``document`` is the (location, identifier, sent) tuple of the feed
+    and is recorded in cap_documents in that transaction too. The same statement
+    adds the new rows to alert_daily_stats. Returns the subset of ``rows`` that
+    was newly inserted; rows that already existed are skipped by ON CONFLICT and
+    are not returned.
+    """
+    # expires is the partition key; a cap:info without it could never be stored
+    rows = [row for row in rows if row.expires]
+    if not rows and not document:
+        return []
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        if document:
+            cursor.execute("""
+                           INSERT INTO cap_documents (location, identifier, sent)
+                           VALUES (%s, %s, %s) ON CONFLICT DO NOTHING
+                           """, document)
+
+        if not rows:
+            conn.commit()
+            return []
+
+        texts = {}
+        for row in rows:
+            for text in (row.description, row.instruction):
+                if text is not None:
+                    texts.setdefault(text_hash(text), text)
+
+        # Texts shared by earlier alerts already exist and are skipped by the conflict clause
+        if texts:
+            execute_values(cursor, "INSERT INTO alert_text (hash, body) VALUES %s ON CONFLICT (hash) DO NOTHING",
+                           list(texts.items()), page_size=len(texts))
+
+        inserted = execute_values(cursor, f"""
+                       WITH inserted AS (
+                           INSERT INTO alert_info (alert_identifier, language, event, effective, onset,
+                                                   expires, severity, urgency, certainty, headline,
+                                                   description_hash, instruction_hash, area)
+                           VALUES %s ON CONFLICT (alert_identifier, language, event, onset, expires) DO NOTHING
+                           RETURNING alert_identifier, language, event, effective, onset, expires,
+                                     severity, area_key
+                       ), stats AS (
+                           INSERT INTO alert_daily_stats (day, area_key, severity, event, language, alerts)
+                           SELECT {STATS_DAY_SQL}, area_key, severity, event, language, COUNT(*)
+                           FROM inserted
+                           GROUP BY 1, 2, 3, 4, 5
+                           ON CONFLICT (day, area_key, severity, event, language)
+                           DO UPDATE SET alerts = alert_daily_stats.alerts + EXCLUDED.alerts
+                       )
+                       SELECT alert_identifier, language, event, onset FROM inserted
+                       """, [
+                           (row.identifier, row.language, row.event, row.effective,
+                            row.onset, row.expires, row.severity, row.urgency,
+                            row.certainty, row.headline, text_hash(row.description),
+                            text_hash(row.instruction), row.area)
+                           for row in rows
+                       ], page_size=len(rows), fetch=True)
+
+        inserted_keys = {_alert_info_key(*returned) for returned in inserted}
+        new_rows = []
+        for row in rows:
+            key = _alert_info_key(row.identifier, row.language, row.event, row.onset)
+            # discard so a duplicate cap:info within the same feed is only reported once
+            if key in inserted_keys:
+                inserted_keys.discard(key)
+                new_rows.append(row)
+
+        outbox = [(Json(row._asdict()),) for row in new_rows if row.language in outbox_languages]
+        if outbox:
+            execute_values(cursor, "INSERT INTO event_outbox (payload) VALUES %s",
+                           outbox, page_size=len(outbox))
+
+        conn.commit()
+        return new_rows
+    except Exception as e:
+        conn.rollback()
+        print(f"Error inserting alert info: {e}")
+        raise
+    finally:
+        cursor.close()
+        release_connection(conn)
+
+
+def drain_outbox(publish_batch, batch_size: int = OUTBOX_BATCH_SIZE) -> int:
+    """Publish pending outbox events in batches and mark them as sent.
+
+    Rows are locked with SKIP LOCKED so concurrent runs never publish the same
+    batch. ``publish_batch`` returns one confirmed flag per event; only confirmed
+    events are marked as sent. Failed, nacked or unroutable events stay pending
+    with their attempt count and error bumped and are retried on the next drain.
+    Returns the number of events published.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    published = 0
+
+    try:
+        while True:
+            cursor.execute("""
+                           SELECT id, payload FROM event_outbox
+                           WHERE published_at IS NULL
+                           ORDER BY id
+                           LIMIT %s FOR UPDATE SKIP LOCKED
+                           """, (batch_size,))
+            pending = cursor.fetchall()
+            if not pending:
+                break
+
+            ids = [row[0] for row in pending]
+            try:
+                confirmed = publish_batch([row[1] for row in pending])
+            except Exception as e:
+                print(f"Error publishing {len(ids)} outbox events, will retry: {e}")
+                cursor.execute("""
+                               UPDATE event_outbox SET attempts = attempts + 1, last_error = %s
+                               WHERE id = ANY(%s)
+                               """, (str(e), ids))
+                conn.commit()
+                break
+
+            sent = [event_id for event_id, ok in zip(ids, confirmed) if ok]
+            failed = [event_id for event_id, ok in zip(ids, confirmed) if not ok]
+            cursor.execute("""
+                           UPDATE event_outbox SET attempts = attempts + 1, published_at = NOW(), last_error = NULL
+                           WHERE id = ANY(%s)
+                           """, (sent,))
+            cursor.execute("""
+                           UPDATE event_outbox SET attempts = attempts + 1,
+                                                   last_error = 'not confirmed by broker (nacked, unroutable or timed out)'
+                           WHERE id = ANY(%s)
+                           """, (failed,))
+            conn.commit()
+            published += len(sent)
+
+            # Rejected events wait for the next drain rather than being re-sent right away
+            if failed:
+                print(f"{len(failed)} outbox events not confirmed by the broker, will retry")
+                break
+
+        # Sent events are only kept for a while for troubleshooting
+        cursor.execute("""
+                       DELETE FROM event_outbox
+                       WHERE published_at < NOW() - make_interval(hours => %s)
+                       """, (OUTBOX_RETENTION_HOURS,))
+        conn.commit()
+        return published
+    except Exception as e:
+        conn.rollback()
+        print(f"Error draining outbox: {e}")
+        raise
+    finally:
+        cursor.close()
+        release_connection(conn)
 
 
 def insert_alert_data(location: str, alert_data: dict):
@@ -135,4 +697,4 @@ def insert_alert_data(location: str, alert_data: dict):
         raise
     finally:
         cursor.close()
-        conn.close()
+        release_connection(conn)
@@ -0,0 +1,93 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from requests.adapters import HTTPAdapter
+
+BASE_URL = os.getenv(
+    "ARSO_BASE_URL",
+    "https://meteo.arso.gov.si/uploads/probase/www/warning/text/sl/warning_SLOVENIA_{queried_location}_latest_CAP.xml",
+)
+
+FETCH_WORKERS = int(os.getenv("FETCH_WORKERS", "5"))
+FETCH_CONNECT_TIMEOUT = float(os.getenv("FETCH_CONNECT_TIMEOUT", "3"))
+FETCH_READ_TIMEOUT = float(os.getenv("FETCH_READ_TIMEOUT", "10"))
+
+session = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Return the shared keep-alive session used for all feed requests.
+
+    All feeds live on one host, so the connection pool is sized to the worker
+    count; FETCH_WORKERS alone bounds how many requests hit ARSO at once.
+    """
+    global session
+
+    with _session_lock:
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=FETCH_WORKERS,
+                pool_maxsize=FETCH_WORKERS,
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+        return session
+
+
+def fetch_warning_data(location: str, state: dict = None) -> dict:
+    """Fetch one feed, sending the stored validators as a conditional request.
+
+    Returns a dict with ``not_modified`` set when the server answered 304; otherwise
+    it carries the body and the new ``etag``/``last_modified`` validators.
+    """
+    url = BASE_URL.format(queried_location=location)
+    headers = {}
+    if state:
+        if state.get("etag"):
+            headers["If-None-Match"] = state["etag"]
+        if state.get("last_modified"):
+            headers["If-Modified-Since"] = state["last_modified"]
+
+    response = get_session().get(
+        url,
+        headers=headers,
+        timeout=(FETCH_CONNECT_TIMEOUT, FETCH_READ_TIMEOUT),
+    )
+
+    if response.status_code == 304:
+        return {"not_modified": True}
+
+    response.raise_for_status()
+    return {
+        "not_modified": False,
+        "content": response.content,
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+    }
+
+
+def fetch_all_locations(locations: list, states: dict = None):
+    """Fetch all feeds in parallel and yield (location, response) as each one completes.
+
+    Failed feeds are reported and skipped so one slow or broken region does not
+    hold back the others.
+    """
+    states = states or {}
+    workers = max(1, min(FETCH_WORKERS, len(locations)))
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fetch") as pool:
+        futures = {
+            pool.submit(fetch_warning_data, location, states.get(location)): location
+            for location in locations
+        }
+
+        for future in as_completed(futures):
+            location = futures[future]
+            try:
+                yield location, future.result()
+            except requests.RequestException as e:
+                print(f"Failed to fetch data for {location}: {e}")
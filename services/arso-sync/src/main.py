@@ -1,132 +1,154 @@
-from time import sleep
-import requests
+import argparse
+import hashlib
 import xml.etree.ElementTree as ET
-from db import create_tables, get_connection
-from publisher import publish_event
+from datetime import datetime, timezone
+from cap_parser import iter_alert_records, read_alert_header
+from db import (
+    create_tables,
+    drain_outbox,
+    get_feed_states,
+    insert_alert_infos,
+    is_document_processed,
+    maintain_partitions,
+    update_feed_state
+)
+from daemon import run_daemon
+from fetcher import fetch_all_locations
+from publisher import publish_batch
 
 
-BASE_URL = "https://meteo.arso.gov.si/uploads/probase/www/warning/text/sl/warning_SLOVENIA_{queried_location}_latest_CAP.xml"
 LOCATIONS_ARRAY = ["SOUTH-WEST", "SOUTH-EAST", "MIDDLE", "NORTH-EAST", "NORTH-WEST"]
+HIGH_SEVERITIES = ("Severe", "Extreme")
+PUBLISH_LANGUAGES = ("en-GB",)
 
-def fetch_warning_data(location: str) -> str:
-    url = BASE_URL.format(queried_location=location)
-    response = requests.get(url)
-    response.raise_for_status()
-    return response.text
+def digest(data) -> str:
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
 
-def extract_area_from_headline(headline: str) -> str:
-    if "/" not in headline:
+def parse_expiry(value: str):
+    """Parse a CAP ``expires`` value as an aware UTC datetime, or None when it is unusable."""
+    try:
+        expires = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except (TypeError, ValueError) as e:
+        print(f"Ignoring malformed expires value {value!r}: {e}")
         return None
-    return headline.split("/")[-1].strip()
+    if expires.tzinfo is None:
+        expires = expires.replace(tzinfo=timezone.utc)
+    return expires.astimezone(timezone.utc)
+
+def process_feed(location: str, response: dict, state: dict, counters: dict):
+    """Parse and store one fetched feed unless it is unchanged or its document was already ingested."""
+    state = state or {}
+
+    if response["not_modified"]:
+        update_feed_state(location, "not_modified")
+        counters["not_modified"] += 1
+        print(f"{location}: not modified (304), skipped")
+        return
+
+    content = response["content"]
+    body_digest = digest(content)
+    validators = {"etag": response["etag"], "last_modified": response["last_modified"]}
+
+    if body_digest == state.get("body_digest"):
+        update_feed_state(location, "unchanged", **validators)
+        counters["unchanged"] += 1
+        print(f"{location}: body unchanged, skipped")
+        return
 
-def parse_warning_data(data: str) -> dict:
-    conn = get_connection()
-    cursor = conn.cursor()
     try:
-        # Define the namespace
-        ns = {'cap': 'urn:oasis:names:tc:emergency:cap:1.2'}
-
-        root = ET.fromstring(data)
-
-        # Parse basic alert info
-        identifier = root.find('cap:identifier', ns).text
-        alert_info = {
-            'identifier': identifier,
-            'sender': root.find('cap:sender', ns).text,
-            'sent': root.find('cap:sent', ns).text,
-            'status': root.find('cap:status', ns).text,
-        }
-
-        # Parse info element
-        for info in root.findall('cap:info', ns):
-            if info is not None:
-                language = info.find('cap:language', ns).text
-                #event = info.find('cap:event', ns).text.split(" - ")[0]  # Get the part before " - "
-                severity = info.find('cap:severity', ns).text
-                urgency = info.find('cap:urgency', ns).text
-                effective = info.find('cap:effective', ns).text
-                onset = info.find('cap:onset', ns).text
-                expires = info.find('cap:expires', ns).text
-                certainty = info.find('cap:certainty', ns).text
-                headline = info.find('cap:headline', ns).text
-                description = info.find('cap:description', ns).text
-                instruction = info.find('cap:instruction', ns).text
-
-                # Parse parameters
-                #parameters = {}
-                event = "Unknown"
-                for param in info.findall('cap:parameter', ns):
-                    value_name = param.find('cap:valueName', ns).text
-                    value = param.find('cap:value', ns).text
-                    if value_name == "awareness_type":
-                        event = value
-
-                #print(parameters)
-
-                alert_info[language] = alert_info[language] if language in alert_info else {}
-                alert_info[language][event] = alert_info[language][event] if event in alert_info[language] else []
-                alert_info[language][event].append({
-                    'effective': effective,
-                    'onset': onset,
-                    'expires': expires,
-                    'severity': severity,
-                    'urgency': urgency,
-                    'certainty': certainty,
-                    'headline': headline,
-                    'description': description,
-                    'instruction': instruction
-                })
-                
-                area = extract_area_from_headline(headline)
-
-                cursor.execute("""
-                    INSERT INTO alert_info (alert_identifier, language, event, effective, onset,
-                                            expires, severity, urgency, certainty, headline,
-                                            description, instruction, area)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s) ON CONFLICT (alert_identifier, language, event, onset) DO NOTHING""",
-                    (identifier, language, event, effective, onset,
-                     expires, severity, urgency, certainty, headline,
-                     description, instruction, area))
-
-                conn.commit()
-                
-                if cursor.rowcount == 1 and language == "en-GB":
-                    publish_event({
-                        "identifier": identifier,
-                        "language": language,
-                        "event": event,
-                        "effective": effective,
-                        "onset": onset,
-                        "expires": expires,
-                        "severity": severity,
-                        "urgency": urgency,
-                        "certainty": certainty,
-                        "headline": headline,
-                        "description": description,
-                        "instruction": instruction,
-                        "area": area
-                    })
-
-        return alert_info
-
+        header = read_alert_header(content)
+    except ET.ParseError as e:
+        print(f"Error parsing XML header for {location}: {e}")
+        header = {}
+
+    identifier_digest = digest(f"{header.get('identifier')}|{header.get('sent')}") if header else None
+    document = (location, header["identifier"], header["sent"]) \
+        if header.get("identifier") and header.get("sent") else None
+
+    # Same document re-served with a different body: one key lookup instead of a traversal and insert
+    if document and is_document_processed(document):
+        update_feed_state(location, "unchanged", body_digest=body_digest,
+                          identifier_digest=identifier_digest, **validators)
+        counters["unchanged"] += 1
+        print(f"{location}: alert {header['identifier']} already processed, skipped")
+        return
+
+    preprocessed_alert = parse_warning_data(content, document)
+    print(preprocessed_alert)
+    update_feed_state(location, "processed", body_digest=body_digest,
+                      identifier_digest=identifier_digest, **validators)
+    counters["processed"] += 1
+    counters["inserted"] += preprocessed_alert.get("inserted", 0)
+
+    severe_until = preprocessed_alert.get("severe_until")
+    if severe_until and (counters["severe_until"] is None or severe_until > counters["severe_until"]):
+        counters["severe_until"] = severe_until
+
+def parse_warning_data(data, document: tuple = None) -> dict:
+    header = {}
+    try:
+        records = list(iter_alert_records(data, header))
     except ET.ParseError as e:
         print(f"Error parsing XML: {e}")
         return {}
-    finally:
-        cursor.close()
-        conn.close()
+
+    # One multi-row insert and one commit per feed; new en-GB rows are queued in the outbox
+    inserted = insert_alert_infos(records, outbox_languages=PUBLISH_LANGUAGES, document=document)
+
+    # Latest expiry of any high-severity warning in the feed, used by the daemon's poll schedule
+    severe_expiries = [
+        expires
+        for expires in (
+            parse_expiry(record.expires)
+            for record in records
+            if record.severity in HIGH_SEVERITIES and record.expires
+        )
+        if expires is not None
+    ]
+
+    return {
+        **header,
+        "records": len(records),
+        "inserted": len(inserted),
+        "severe_until": max(severe_expiries, default=None),
+    }
+
+
+def run_once() -> dict:
+    """Check every feed once and return the per-outcome counters of this run."""
+    states = get_feed_states()
+    counters = {"processed": 0, "not_modified": 0, "unchanged": 0, "inserted": 0,
+                "published": 0, "severe_until": None}
+
+    # Feeds are fetched in parallel; each one is parsed as soon as it arrives
+    for location, response in fetch_all_locations(LOCATIONS_ARRAY, states):
+        process_feed(location, response, states.get(location), counters)
+
+    # Also retries events left pending by earlier runs
+    try:
+        counters["published"] = drain_outbox(publish_batch)
+    except Exception as e:
+        print(f"Outbox drain failed, events stay queued: {e}")
+
+    print(f"Feeds processed: {counters['processed']}, "
+          f"skipped (not modified): {counters['not_modified']}, "
+          f"skipped (unchanged): {counters['unchanged']}, "
+          f"events published: {counters['published']}")
+    return counters
 
 
 if __name__ == "__main__":
-    create_tables()
+    arg_parser = argparse.ArgumentParser(description="Sync ARSO CAP warnings into Postgres")
+    arg_parser.add_argument("--daemon", action="store_true",
+                            help="keep running and poll on an adaptive schedule instead of a single pass")
+    args = arg_parser.parse_args()
 
-    for location in LOCATIONS_ARRAY:
-        try:
-            data = fetch_warning_data(location)
-            preprocessed_alert = parse_warning_data(data)
-            print(preprocessed_alert)
-            #print(f"Data for {location}:\n{data}\n")
-        except requests.HTTPError as e:
-            print(f"Failed to fetch data for {location}: {e}")
+    create_tables()
 
-        sleep(2)
+    if args.daemon:
+        run_daemon(run_once, maintenance=maintain_partitions)
+    else:
+        maintain_partitions()
+        run_once()
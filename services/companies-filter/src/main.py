@@ -1,4 +1,6 @@
 import os
+import threading
+from collections import OrderedDict
 import requests
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
@@ -21,8 +23,13 @@ app.add_middleware(
 )
 COMPANIES_SYNC_URL = os.getenv("COMPANIES_SYNC_URL")
 ARSO_SYNC_URL = os.getenv("ARSO_SYNC_URL")
+EVENTS_ETAG_CACHE_SIZE = int(os.getenv("EVENTS_ETAG_CACHE_SIZE", "1024"))
 subscribers = {}   # user_id → list of pending events
 
+# (url, organization, areas) → (etag, body) of the last 200 answer, for If-None-Match
+events_etag_cache = OrderedDict()
+events_etag_lock = threading.Lock()
+
 @app.get("/health")
 def health_check():
     return {"status": "ok"}
@@ -39,17 +46,39 @@ def get_events_for_user(user_id: str):
     else:
         base_request_url = COMPANIES_SYNC_URL
 
+    url = f"{base_request_url}/events/active"
+    areas = ",".join(user_regions)
+    cache_key = (url, organization, areas)
+    with events_etag_lock:
+        cached = events_etag_cache.get(cache_key)
+
+    headers = {"If-None-Match": cached[0]} if cached else {}
     resp = requests.get(
-        f"{base_request_url}/events/active",
+        url,
         params={
             "organization_name": organization,
-            "areas": ",".join(user_regions)
-        }
+            "areas": areas
+        },
+        headers=headers
     )
 
+    if resp.status_code == 304 and cached:
+        with events_etag_lock:
+            if cache_key in events_etag_cache:
+                events_etag_cache.move_to_end(cache_key)
+        return cached[1]
     if resp.status_code != 200:
         return []
-    return resp.json()
+
+    body = resp.json()
+    etag = resp.headers.get("ETag")
+    if etag:
+        with events_etag_lock:
+            events_etag_cache[cache_key] = (etag, body)
+            events_etag_cache.move_to_end(cache_key)
+            while len(events_etag_cache) > EVENTS_ETAG_CACHE_SIZE:
+                events_etag_cache.popitem(last=False)
+    return body
 
 
 # RabbitMQ calls for each new event
@@ -0,0 +1,83 @@
+"""Benchmark of the bulk event upsert behind POST /events.
+
+For each batch size, upserts a batch of new events (inserts), the same batch
+with changed fields (updates) and the same batch again (unchanged), and reports
+events/second for each pass. Runs against the Postgres configured by the usual
+DB_* variables, under a throwaway organization.
+
+    DB_HOST=localhost DB_NAME=companies python bench/bench_upsert.py --sizes 1 10 100 1000 10000 --cleanup
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from db import create_tables, get_connection, insert_organization, release_connection, upsert_events
+
+
+def make_events(size: int, tag: str, revision: int, now: datetime) -> list:
+    return [
+        {
+            "type": "outage",
+            "area": f"Area {i % 50}",
+            "headline": f"{tag} event {i}",
+            "description": f"Description revision {revision}",
+            "instruction": "Stay tuned",
+            "effective": now.isoformat(),
+            "expires": (now + timedelta(hours=6)).isoformat(),
+            "severity": "Moderate",
+            "urgency": "Expected",
+        }
+        for i in range(size)
+    ]
+
+
+def timed(org_id, events: list) -> tuple:
+    started = time.perf_counter()
+    results = upsert_events(org_id, events)
+    return time.perf_counter() - started, [status for status, _ in results]
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 100, 1000, 10000])
+    arg_parser.add_argument("--repeat", type=int, default=3, help="best of N runs per pass")
+    arg_parser.add_argument("--cleanup", action="store_true", help="delete the benchmark organization afterwards")
+    args = arg_parser.parse_args()
+
+    create_tables()
+    org_name = f"bench-upsert-{int(time.time())}"
+    org_id, _ = insert_organization(org_name)
+
+    print(f"{'batch':>6} {'insert ev/s':>12} {'update ev/s':>12} {'unchanged ev/s':>15}")
+    for size in args.sizes:
+        best = {"inserted": None, "updated": None, "unchanged": None}
+        for run in range(args.repeat):
+            tag = f"{size}-{run}"
+            now = datetime.now(timezone.utc)
+            for expected, revision in (("inserted", 0), ("updated", 1), ("unchanged", 1)):
+                elapsed, statuses = timed(org_id, make_events(size, tag, revision, now))
+                if any(status != expected for status in statuses):
+                    print(f"warning: batch {size} expected all {expected}, got {sorted(set(statuses))}")
+                if best[expected] is None or elapsed < best[expected]:
+                    best[expected] = elapsed
+
+        print(f"{size:>6} {size / best['inserted']:>12,.0f} {size / best['updated']:>12,.0f} "
+              f"{size / best['unchanged']:>15,.0f}")
+
+    if args.cleanup:
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM organization_events WHERE organization_id = %s", (org_id,))
+        cursor.execute("DELETE FROM organizations WHERE organization_id = %s", (org_id,))
+        conn.commit()
+        cursor.close()
+        release_connection(conn)
+        print(f"Benchmark organization {org_name} removed")
+
+
+if __name__ == "__main__":
+    main()
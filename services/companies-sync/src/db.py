@@ -1,13 +1,17 @@
 # companies-sync/db.py
 
-from datetime import datetime
+from datetime import datetime, timezone
+import hashlib
 import psycopg2
+import psycopg2.extensions
 from psycopg2 import sql
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import Json, RealDictCursor, execute_values
 import os
+import threading
 from dateutil import parser
 import json
 import uuid_utils as uuid
+from pool import ConnectionPool
 
 DATABASE_CONFIG = {
     'host': os.getenv('DB_HOST'),
@@ -17,8 +21,125 @@ DATABASE_CONFIG = {
     'password': os.getenv('DB_PASSWORD')
 }
 
+POOL_CONFIG = {
+    'maxconn': int(os.getenv('DB_POOL_MAX', '10')),
+    'acquire_timeout': float(os.getenv('DB_POOL_TIMEOUT', '5')),
+    'health_check_idle': float(os.getenv('DB_POOL_HEALTHCHECK_IDLE', '30')),
+}
+
+# Hash partitions of organization_events/organization_oncall; fixed once the tables exist
+ORG_TABLE_PARTITIONS = int(os.getenv('ORG_TABLE_PARTITIONS', '8'))
+OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', '500'))
+OUTBOX_RETENTION_HOURS = int(os.getenv('OUTBOX_RETENTION_HOURS', '24'))
+
+# Columns returned for an event, in the order of the former per-organization tables
+EVENT_COLUMNS = (
+    "id", "type", "area", "headline", "description", "instruction",
+    "effective", "expires", "severity", "urgency", "created_at",
+)
+
+pool = None
+pool_lock = threading.Lock()
+
+
+class PreparingConnection(psycopg2.extensions.connection):
+    """Connection that remembers which server-side prepared statements it holds."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+
+
+def get_pool() -> ConnectionPool:
+    """Return the process-wide connection pool, creating it on first use."""
+    global pool
+
+    with pool_lock:
+        if pool is None:
+            pool = ConnectionPool(connection_factory=PreparingConnection, **POOL_CONFIG, **DATABASE_CONFIG)
+        return pool
+
+
 def get_connection():
-    return psycopg2.connect(**DATABASE_CONFIG)
+    return get_pool().getconn()
+
+def release_connection(conn):
+    get_pool().putconn(conn)
+
+def close_pool():
+    global pool
+
+    with pool_lock:
+        if pool is not None:
+            pool.closeall()
+            pool = None
+
+def pool_stats() -> dict:
+    return pool.stats() if pool is not None else {}
+
+
+def execute_prepared(cursor, name: str, statement: str, params: list):
+    """Run ``statement`` (using $1, $2, ... placeholders) as a named prepared statement.
+
+    The statement is prepared on first use per connection and executed by name after that.
+    """
+    conn = cursor.connection
+    if name not in conn.prepared:
+        cursor.execute(f"PREPARE {name} AS {statement}")
+        conn.prepared.add(name)
+
+    placeholders = ", ".join(["%s"] * len(params))
+    cursor.execute(f"EXECUTE {name} ({placeholders})", params)
+
+
+def migrate_organization_tables(cursor):
+    """Move rows of the legacy ``<uuid>_organization_*`` tables into the shared tables and drop them."""
+    # One catalog lookup; once every legacy table is migrated there is nothing else to do
+    cursor.execute("""
+        SELECT c.relname
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = current_schema()
+          AND c.relkind = 'r'
+          AND c.relname ~ '^[0-9a-f-]{36}_organization_(events|oncall)$'
+    """)
+    legacy_tables = {name for (name,) in cursor.fetchall()}
+    if not legacy_tables:
+        return
+
+    cursor.execute("SELECT organization_id FROM organizations")
+    for (org_id,) in cursor.fetchall():
+        events_name = f"{org_id}_organization_events"
+        oncall_name = f"{org_id}_organization_oncall"
+        if events_name not in legacy_tables and oncall_name not in legacy_tables:
+            continue
+        events_table = sql.Identifier(events_name)
+        oncall_table = sql.Identifier(oncall_name)
+
+        if events_name in legacy_tables:
+            cursor.execute(sql.SQL("""
+                INSERT INTO organization_events (organization_id, type, area, headline, description,
+                                                 instruction, effective, expires, severity, urgency,
+                                                 created_at)
+                SELECT %s, type, area, headline, description, instruction, effective, expires,
+                       severity, urgency, created_at
+                FROM {}
+                ON CONFLICT (organization_id, type, area, headline) DO NOTHING
+            """).format(events_table), (org_id,))
+            cursor.execute(sql.SQL("DROP TABLE {}").format(events_table))
+
+        if oncall_name in legacy_tables:
+            cursor.execute(sql.SQL("""
+                INSERT INTO organization_oncall (organization_id, on_call_email, on_call_from,
+                                                 on_call_to, levels, areas, created_at, natural_key)
+                SELECT %s, on_call_email, on_call_from, on_call_to, levels, areas, created_at,
+                       oncall_natural_key(on_call_email, on_call_from, on_call_to, levels, areas)
+                FROM {}
+                ON CONFLICT (organization_id, natural_key) DO NOTHING
+            """).format(oncall_table), (org_id,))
+            cursor.execute(sql.SQL("DROP TABLE {}").format(oncall_table))
+
+        print(f"Migrated tables of organization {org_id}")
 
 def create_tables():
     conn = get_connection()
@@ -35,37 +156,35 @@ def create_tables():
             );
         """)
 
-        conn.commit()
-        print("Tables created successfully")
-    except Exception as e:
-        conn.rollback()
-        print(f"Error creating tables: {e}")
-        raise
-    finally:
-        cursor.close()
-        conn.close()
-
-def insert_organization(org_name: str):
-    print("connecting")
-    conn = get_connection()
-    cursor = conn.cursor()
-    print("done connecting")
-    print(org_name)
-    clean_name = " ".join(org_name.split())
-    org_uuid = str(uuid.uuid7())
-    try:
+        # Identity of an on-call entry: email, window and the levels/areas as sets, so
+        # reordered or repeated list items do not create a second entry
         cursor.execute("""
-            INSERT INTO organizations (organization_id, organization_name)
-            VALUES (%s, %s)
-            ON CONFLICT (organization_name) DO NOTHING;
-        """, (org_uuid, clean_name,))
-
-        events_table_name = str(org_uuid) + "_organization_events"
-        oncall_table_name = str(org_uuid) + "_organization_oncall"
+            CREATE OR REPLACE FUNCTION oncall_canonical_set(value JSONB) RETURNS JSONB
+            LANGUAGE SQL IMMUTABLE AS $$
+                SELECT CASE WHEN jsonb_typeof(value) = 'array'
+                            THEN COALESCE((SELECT jsonb_agg(DISTINCT e ORDER BY e) FROM jsonb_array_elements(value) e),
+                                          '[]'::jsonb)
+                            ELSE value END
+            $$;
+
+            CREATE OR REPLACE FUNCTION oncall_natural_key(email TEXT, window_from TIMESTAMPTZ,
+                                                          window_to TIMESTAMPTZ, levels JSONB, areas JSONB)
+            RETURNS TEXT LANGUAGE SQL STABLE AS $$
+                SELECT encode(sha256(convert_to(jsonb_build_array(
+                    LOWER(BTRIM(email)),
+                    EXTRACT(EPOCH FROM window_from),
+                    EXTRACT(EPOCH FROM window_to),
+                    oncall_canonical_set(levels),
+                    oncall_canonical_set(areas)
+                )::text, 'UTF8')), 'hex')
+            $$;
+        """)
 
-        cursor.execute(sql.SQL("""
-            CREATE TABLE IF NOT EXISTS {} (
-                id SERIAL PRIMARY KEY,
+        # Every organization shares these tables, hash-partitioned by organization_id
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS organization_events (
+                organization_id UUID NOT NULL,
+                id BIGSERIAL,
                 type TEXT NOT NULL,
                 area TEXT NOT NULL,
                 headline TEXT NOT NULL,
@@ -76,85 +195,194 @@ def insert_organization(org_name: str):
                 severity TEXT,
                 urgency TEXT,
                 created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE (type, area, headline)
-            );
-        """).format(sql.Identifier(events_table_name)))
+                area_key TEXT GENERATED ALWAYS AS (LOWER(area)) STORED,
+                PRIMARY KEY (organization_id, id),
+                UNIQUE (organization_id, type, area, headline)
+            ) PARTITION BY HASH (organization_id);
+        """)
 
-        cursor.execute(sql.SQL("""
-            CREATE TABLE IF NOT EXISTS {} (
-                id SERIAL PRIMARY KEY,
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS organization_oncall (
+                organization_id UUID NOT NULL,
+                id BIGSERIAL,
                 on_call_email TEXT NOT NULL,
                 on_call_from TIMESTAMPTZ NOT NULL,
                 on_call_to   TIMESTAMPTZ NOT NULL,
                 levels JSONB NOT NULL,
                 areas  JSONB NOT NULL,
-                created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+                created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+                natural_key TEXT NOT NULL,
+                PRIMARY KEY (organization_id, id)
+            ) PARTITION BY HASH (organization_id);
+        """)
+
+        for table in ("organization_events", "organization_oncall"):
+            cursor.execute("""
+                SELECT COUNT(*) FROM pg_inherits WHERE inhparent = %s::regclass
+            """, (table,))
+            if cursor.fetchone()[0]:
+                continue
+            for remainder in range(ORG_TABLE_PARTITIONS):
+                cursor.execute(sql.SQL("""
+                    CREATE TABLE {} PARTITION OF {} FOR VALUES WITH (MODULUS %s, REMAINDER %s)
+                """).format(sql.Identifier(f"{table}_p{remainder}"), sql.Identifier(table)),
+                    (ORG_TABLE_PARTITIONS, remainder))
+
+        # Events to publish, written in the same transaction as the events themselves
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS event_outbox (
+                id BIGSERIAL PRIMARY KEY,
+                payload JSONB NOT NULL,
+                created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+                published_at TIMESTAMPTZ,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT
             );
-        """).format(sql.Identifier(oncall_table_name)))
+            CREATE INDEX IF NOT EXISTS idx_event_outbox_pending ON event_outbox (id) WHERE published_at IS NULL;
+        """)
+
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_organization_events_area_key_expires
+                ON organization_events (organization_id, area_key, expires);
+            CREATE INDEX IF NOT EXISTS idx_organization_oncall_window
+                ON organization_oncall (organization_id, on_call_to, on_call_from);
+        """)
+
+        # Tables created before natural_key existed: fill it, drop duplicates, then enforce it
+        cursor.execute("""
+            SELECT 1 FROM information_schema.columns
+            WHERE table_schema = current_schema()
+              AND table_name = 'organization_oncall'
+              AND column_name = 'natural_key'
+        """)
+        if cursor.fetchone() is None:
+            cursor.execute("""
+                ALTER TABLE organization_oncall ADD COLUMN natural_key TEXT;
+                UPDATE organization_oncall
+                   SET natural_key = oncall_natural_key(on_call_email, on_call_from, on_call_to, levels, areas);
+            """)
+            cursor.execute("""
+                DELETE FROM organization_oncall a
+                 USING organization_oncall b
+                 WHERE a.organization_id = b.organization_id
+                   AND a.natural_key = b.natural_key
+                   AND a.id > b.id
+            """)
+            print(f"Backfilled on-call natural_key, deleted {cursor.rowcount} duplicate rows")
+            cursor.execute("ALTER TABLE organization_oncall ALTER COLUMN natural_key SET NOT NULL")
+
+        cursor.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_organization_oncall_natural_key
+                ON organization_oncall (organization_id, natural_key);
+        """)
+
+        migrate_organization_tables(cursor)
 
         conn.commit()
+        print("Tables created successfully")
+    except Exception as e:
+        conn.rollback()
+        print(f"Error creating tables: {e}")
+        raise
+    finally:
+        cursor.close()
+        release_connection(conn)
+
+def insert_organization(org_name: str):
+    """Create the organization unless it exists; returns (organization_id, created)."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    clean_name = " ".join(org_name.split())
+    org_uuid = str(uuid.uuid7())
+    try:
+        # The SELECT branch sees the snapshot before the INSERT, so at most one branch returns a row
+        execute_prepared(cursor, "insert_organization", """
+            WITH inserted AS (
+                INSERT INTO organizations (organization_id, organization_name)
+                VALUES ($1, $2)
+                ON CONFLICT (organization_name) DO NOTHING
+                RETURNING organization_id
+            )
+            SELECT organization_id, TRUE FROM inserted
+            UNION ALL
+            SELECT organization_id, FALSE FROM organizations WHERE organization_name = $2
+        """, [org_uuid, clean_name])
+        result = cursor.fetchone()
+
+        if result is None:
+            # Neither branch sees a row another transaction committed while the INSERT
+            # waited on it; a new statement takes a fresh snapshot that does
+            execute_prepared(cursor, "organization_id_by_name", """
+                SELECT organization_id FROM organizations WHERE organization_name = $1
+            """, [clean_name])
+            row = cursor.fetchone()
+            result = (row[0], False) if row else None
+
+        conn.commit()
+        return (result[0], result[1]) if result else (None, False)
     except Exception as e:
         conn.rollback()
         print(f"Error inserting organization: {e}")
+        return None, False
     finally:
         cursor.close()
-        conn.close()
+        release_connection(conn)
 
 
 def insert_oncall_schedule(org_id: int, schedule: list):
+    """Store on-call entries in one statement; entries whose natural key already exists are skipped.
+
+    Returns one {"email", "status"} per entry, status "inserted" or "exists" (also
+    for a repeat of an earlier entry in the same list).
+    """
+    if not schedule:
+        return []
+
     conn = get_connection()
     cursor = conn.cursor()
 
-    results = []
     try:
-        for entry in schedule:
-            levels_json = json.dumps(entry["levels"])
-            areas_json = json.dumps(entry["areas"])
-            start = parser.parse(entry["on_call_from"])
-            end = parser.parse(entry["on_call_to"])
-            email = entry["on_call_email"]
-
-            oncall_table_name = str(org_id) + "_organization_oncall"
-            cursor.execute(sql.SQL("""
-                SELECT id FROM {}
-                  WHERE on_call_email = %s
-                  AND on_call_from = %s
-                  AND on_call_to = %s
-                  AND levels::text = %s
-                  AND areas::text = %s;
-            """).format(sql.Identifier(oncall_table_name)), (email, start, end, levels_json, areas_json))
-
-            existing = cursor.fetchone()
-
-            if existing:
-                results.append({
-                    "email": email,
-                    "status": "exists"
-                })
-                continue
-
-            oncall_table_name = str(org_id) + "_organization_oncall"
-            cursor.execute(sql.SQL("""
-                INSERT INTO {} (
-                    on_call_email, on_call_from, on_call_to,
-                    levels, areas
-                )
-                VALUES (%s, %s, %s, %s, %s);
-            """).format(sql.Identifier(oncall_table_name)), (
+        values = [
+            (
+                index,
+                org_id,
                 entry["on_call_email"],
-                start,
-                end,
-                levels_json,
-                areas_json
-            ))
+                parser.parse(entry["on_call_from"]),
+                parser.parse(entry["on_call_to"]),
+                json.dumps(entry["levels"]),
+                json.dumps(entry["areas"]),
+            )
+            for index, entry in enumerate(schedule)
+        ]
 
-            results.append({
-                "email": entry["on_call_email"],
-                "status": "inserted"
-            })
+        rows = execute_values(cursor, """
+            WITH input AS (
+                SELECT v.ord, v.organization_id::uuid AS organization_id, v.email,
+                       v.window_from, v.window_to, v.levels::jsonb AS levels, v.areas::jsonb AS areas,
+                       oncall_natural_key(v.email, v.window_from, v.window_to,
+                                          v.levels::jsonb, v.areas::jsonb) AS natural_key
+                FROM (VALUES %s) AS v (ord, organization_id, email, window_from, window_to, levels, areas)
+            ), inserted AS (
+                INSERT INTO organization_oncall (organization_id, on_call_email, on_call_from,
+                                                 on_call_to, levels, areas, natural_key)
+                SELECT organization_id, email, window_from, window_to, levels, areas, natural_key
+                FROM input
+                ORDER BY ord
+                ON CONFLICT (organization_id, natural_key) DO NOTHING
+                RETURNING natural_key
+            )
+            SELECT ord, email,
+                   natural_key IN (SELECT natural_key FROM inserted)
+                   AND ord = MIN(ord) OVER (PARTITION BY natural_key) AS inserted
+            FROM input
+            ORDER BY ord
+        """, values, page_size=len(values), fetch=True)
 
         conn.commit()
-        return results
+        return [
+            {"email": email, "status": "inserted" if inserted else "exists"}
+            for _, email, inserted in rows
+        ]
 
     except Exception as e:
         conn.rollback()
@@ -163,7 +391,7 @@ def insert_oncall_schedule(org_id: int, schedule: list):
 
     finally:
         cursor.close()
-        conn.close()
+        release_connection(conn)
 
 def norm_datetime(value):
     if value in (None, "", " "):
@@ -188,49 +416,201 @@ def norm(val):
     return val
 
 
-def insert_or_update_event(event: dict):
+def event_values(organization_id, event: dict) -> tuple:
+    """Column values of ``event`` for organization_events; raises on a missing or malformed field."""
+    values = (
+        organization_id,
+        event["type"],
+        event["area"],
+        event["headline"],
+        norm_text(event.get("description")),
+        norm_text(event.get("instruction")),
+        norm_datetime(event.get("effective")),
+        norm_datetime(event.get("expires")),
+        norm_text(event.get("severity")),
+        norm_text(event.get("urgency")),
+    )
+    if not all(values[1:4]) or None in values[6:8]:
+        raise ValueError("type, area, headline, effective and expires are required")
+    return values
+
+
+def upsert_events(organization_id, events: list, organization_name: str = None) -> list:
+    """Insert or update a batch of events in one statement and one transaction.
+
+    Returns one (status, queued) pair per event. The status is "inserted",
+    "updated", "unchanged" (an identical row already existed, so nothing was
+    written) or "error" (the event is malformed and was skipped). When the same
+    (type, area, headline) occurs more than once, the last occurrence is written
+    and every occurrence gets its result. With ``organization_name``, every
+    inserted or updated event that has not expired is queued in event_outbox in
+    the same transaction, tagged with the organization; ``queued`` tells whether
+    that happened.
+    """
+    statuses = [("error", False)] * len(events)
+    rows = {}
+    positions = {}
+    for i, event in enumerate(events):
+        try:
+            values = event_values(organization_id, event)
+        except (KeyError, ValueError, OverflowError) as e:
+            print(f"Skipping invalid event {i}: {e}")
+            continue
+        key = values[1:4]
+        rows[key] = values
+        positions.setdefault(key, []).append(i)
+
+    if not rows:
+        return statuses
+
     conn = get_connection()
     cursor = conn.cursor()
 
     try:
-        event_table_name = str(event["organization_id"]) + "_organization_events"
-        cursor.execute(sql.SQL("""
-                       INSERT INTO {} (type, area, headline, description,
-                                                        instruction, effective, expires, severity, urgency)
-                       VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s) ON CONFLICT (type, area, headline)
-            DO
-                       UPDATE SET
-                           description = EXCLUDED.description,
-                           instruction = EXCLUDED.instruction,
-                           effective = EXCLUDED.effective,
-                           expires = EXCLUDED.expires,
-                           severity = EXCLUDED.severity,
-                           urgency = EXCLUDED.urgency,
-                           created_at = CURRENT_TIMESTAMP
-                           RETURNING id;
-                       """).format(sql.Identifier(event_table_name)), (
-                           event["type"],
-                           event["area"],
-                           event["headline"],
-                           norm_text(event.get("description")),
-                           norm_text(event.get("instruction")),
-                           norm_datetime(event.get("effective")),
-                           norm_datetime(event.get("expires")),
-                           norm_text(event.get("severity")),
-                           norm_text(event.get("urgency"))
-                       ))
+        # The WHERE skips rewriting identical rows. Keys found in the statement's snapshot
+        # were updated, the others inserted (xmax cannot be returned from a partitioned table)
+        returned = execute_values(cursor, """
+                       WITH input (organization_id, type, area, headline, description, instruction,
+                                   effective, expires, severity, urgency) AS (
+                           VALUES %s
+                       ), existing AS (
+                           SELECT e.type, e.area, e.headline
+                           FROM organization_events e
+                           JOIN input i ON e.organization_id = i.organization_id
+                                       AND (e.type, e.area, e.headline) = (i.type, i.area, i.headline)
+                       ), written AS (
+                           INSERT INTO organization_events (organization_id, type, area, headline, description,
+                                                            instruction, effective, expires, severity, urgency)
+                           SELECT * FROM input
+                           ON CONFLICT (organization_id, type, area, headline)
+                           DO UPDATE SET
+                               description = EXCLUDED.description,
+                               instruction = EXCLUDED.instruction,
+                               effective = EXCLUDED.effective,
+                               expires = EXCLUDED.expires,
+                               severity = EXCLUDED.severity,
+                               urgency = EXCLUDED.urgency,
+                               created_at = CURRENT_TIMESTAMP
+                           WHERE (organization_events.description, organization_events.instruction,
+                                  organization_events.effective, organization_events.expires,
+                                  organization_events.severity, organization_events.urgency)
+                                 IS DISTINCT FROM
+                                 (EXCLUDED.description, EXCLUDED.instruction, EXCLUDED.effective,
+                                  EXCLUDED.expires, EXCLUDED.severity, EXCLUDED.urgency)
+                           RETURNING type, area, headline
+                       )
+                       SELECT w.type, w.area, w.headline, e.type IS NULL AS inserted
+                       FROM written w
+                       LEFT JOIN existing e USING (type, area, headline)
+                       """, list(rows.values()),
+                       template="(%s::uuid, %s, %s, %s, %s, %s, %s::timestamptz, %s::timestamptz, %s, %s)",
+                       page_size=len(rows), fetch=True)
+
+        written = {(type_, area, headline): inserted for type_, area, headline, inserted in returned}
+        now = datetime.now(timezone.utc)
+        outbox = []
+        for key, indexes in positions.items():
+            status = "unchanged"
+            queued = False
+            if key in written:
+                status = "inserted" if written[key] else "updated"
+                expires = rows[key][7]
+                if expires.tzinfo is None:
+                    expires = expires.replace(tzinfo=timezone.utc)
+                if organization_name is not None and expires >= now:
+                    event = events[indexes[-1]]
+                    outbox.append((Json({**event, "organization_id": str(organization_id),
+                                         "organization_name": organization_name}),))
+                    queued = True
+            for i in indexes:
+                statuses[i] = (status, queued)
+
+        if outbox:
+            execute_values(cursor, "INSERT INTO event_outbox (payload) VALUES %s", outbox, page_size=len(outbox))
 
         conn.commit()
-        return "updated"
+        return statuses
 
     except Exception as e:
         conn.rollback()
         print("DB error:", e)
-        return "error"
+        return statuses
 
     finally:
         cursor.close()
-        conn.close()
+        release_connection(conn)
+
+
+def drain_outbox(publish_batch, batch_size: int = OUTBOX_BATCH_SIZE) -> int:
+    """Publish pending outbox events in batches and mark them as sent.
+
+    Rows are locked with SKIP LOCKED so concurrent runs never publish the same
+    batch. ``publish_batch`` returns one confirmed flag per event; only confirmed
+    events are marked as sent. Failed, nacked or unroutable events stay pending
+    with their attempt count and error bumped and are retried on the next drain.
+    Returns the number of events published.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    published = 0
+
+    try:
+        while True:
+            cursor.execute("""
+                           SELECT id, payload FROM event_outbox
+                           WHERE published_at IS NULL
+                           ORDER BY id
+                           LIMIT %s FOR UPDATE SKIP LOCKED
+                           """, (batch_size,))
+            pending = cursor.fetchall()
+            if not pending:
+                break
+
+            ids = [row[0] for row in pending]
+            try:
+                confirmed = publish_batch([row[1] for row in pending])
+            except Exception as e:
+                print(f"Error publishing {len(ids)} outbox events, will retry: {e}")
+                cursor.execute("""
+                               UPDATE event_outbox SET attempts = attempts + 1, last_error = %s
+                               WHERE id = ANY(%s)
+                               """, (str(e), ids))
+                conn.commit()
+                break
+
+            sent = [event_id for event_id, ok in zip(ids, confirmed) if ok]
+            failed = [event_id for event_id, ok in zip(ids, confirmed) if not ok]
+            cursor.execute("""
+                           UPDATE event_outbox SET attempts = attempts + 1, published_at = NOW(), last_error = NULL
+                           WHERE id = ANY(%s)
+                           """, (sent,))
+            cursor.execute("""
+                           UPDATE event_outbox SET attempts = attempts + 1,
+                                                   last_error = 'not confirmed by broker (nacked, unroutable or timed out)'
+                           WHERE id = ANY(%s)
+                           """, (failed,))
+            conn.commit()
+            published += len(sent)
+
+            # Rejected events wait for the next drain rather than being re-sent right away
+            if failed:
+                print(f"{len(failed)} outbox events not confirmed by the broker, will retry")
+                break
+
+        # Sent events are only kept for a while for troubleshooting
+        cursor.execute("""
+                       DELETE FROM event_outbox
+                       WHERE published_at < NOW() - make_interval(hours => %s)
+                       """, (OUTBOX_RETENTION_HOURS,))
+        conn.commit()
+        return published
+    except Exception as e:
+        conn.rollback()
+        print(f"Error draining outbox: {e}")
+        raise
+    finally:
+        cursor.close()
+        release_connection(conn)
 
 
 def get_organization_id_by_name(org_name: str):
@@ -239,9 +619,9 @@ def get_organization_id_by_name(org_name: str):
     clean_name = " ".join(org_name.split())
 
     try:
-        cursor.execute("""
-            SELECT organization_id FROM organizations WHERE organization_name = %s
-        """, (clean_name,))
+        execute_prepared(cursor, "organization_id_by_name", """
+            SELECT organization_id FROM organizations WHERE organization_name = $1
+        """, [clean_name])
         result = cursor.fetchone()
         return result[0] if result else None
     except Exception as e:
@@ -249,76 +629,271 @@ def get_organization_id_by_name(org_name: str):
         return None
     finally:
         cursor.close()
-        conn.close()
+        release_connection(conn)
 
-def get_active_events(organization_id: int, areas: list):
-    conn = get_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
+def get_active_events(organization_id: int, areas: list, columns: tuple = None):
+    """Active events for ``areas``; ``columns`` limits the selected columns (default all).
 
+    Database errors are raised rather than answered with an empty list, so a
+    failed read is never served (or cached by clients) as "no events".
+    """
     if not organization_id or not areas or len(areas) == 0:
         return []
 
+    conn = get_connection()
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
+
     try:
-        event_table_name = str(organization_id) + "_organization_events"
-        if len(areas) == 1:
-            query = """
-                SELECT *
-                FROM {}
-                  WHERE LOWER(area) = LOWER(%s)
-                  AND expires >= NOW()
-            """
-            params = [areas[0]]
-
-        else:
-            placeholders = ",".join(["LOWER(%s)"] * len(areas))
-            query = f"""
-                SELECT *
-                FROM {{}}
-                  WHERE LOWER(area) IN ({placeholders})
-                  AND expires >= NOW()
-            """
-            params = areas
-
-        cursor.execute(sql.SQL(query).format(sql.Identifier(event_table_name)), params)
+        columns = columns or EVENT_COLUMNS
+        # One prepared statement per distinct projection
+        name = "active_events_" + hashlib.sha1(",".join(columns).encode("utf-8")).hexdigest()[:12]
+        selected = sql.SQL(", ").join(map(sql.Identifier, columns)).as_string(cursor)
+        execute_prepared(cursor, name, f"""
+            SELECT {selected}
+            FROM organization_events
+              WHERE organization_id = $1
+              AND area_key = ANY($2::text[])
+              AND expires >= NOW()
+        """, [organization_id, [area.lower() for area in areas]])
         return cursor.fetchall()
 
     except Exception as e:
         print(f"Error retrieving events: {e}")
-        return []
+        raise
     finally:
         cursor.close()
-        conn.close()
+        release_connection(conn)
+
+def get_active_events_version(organization_id: int, areas: list):
+    """Row count and newest created_at of the active events for ``areas``.
+
+    Cheap aggregate used as a version token so unchanged results can be answered
+    with 304 without fetching the rows.
+    """
+    if not organization_id or not areas:
+        return 0, None
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        execute_prepared(cursor, "active_events_version", """
+            SELECT COUNT(*), MAX(created_at)
+            FROM organization_events
+              WHERE organization_id = $1
+              AND area_key = ANY($2::text[])
+              AND expires >= NOW()
+        """, [organization_id, [area.lower() for area in areas]])
+        return cursor.fetchone()
+
+    except Exception as e:
+        print(f"Error retrieving events version: {e}")
+        return None
+    finally:
+        cursor.close()
+        release_connection(conn)
 
 def get_active_oncall(org_id: int, area: str):
     conn = get_connection()
     cursor = conn.cursor(cursor_factory=RealDictCursor)
 
     try:
-        oncall_table_name = str(org_id) + "_organization_oncall"
-        cursor.execute(sql.SQL("""
-            SELECT 
+        # areas is a JSON array of area names; ? matches one of its elements
+        execute_prepared(cursor, "active_oncall", """
+            SELECT
                 on_call_email AS email,
-                levels,
-                areas
-            FROM {}
-              WHERE NOW() BETWEEN on_call_from AND on_call_to;
-        """).format(sql.Identifier(oncall_table_name)))
-
-        rows = cursor.fetchall()
-        filtered = [
-            {
-                "email": row["email"],
-                "levels": row["levels"]
-            }
-            for row in rows
-            if area in row["areas"]
-        ]
+                levels
+            FROM organization_oncall
+              WHERE organization_id = $1
+              AND NOW() BETWEEN on_call_from AND on_call_to
+              AND areas ? $2
+        """, [org_id, area])
 
-        return filtered
+        return cursor.fetchall()
 
     except Exception as e:
         print("Error fetching active on-call:", e)
         return []
     finally:
         cursor.close()
-        conn.close()
+        release_connection(conn)
+
+
+def copy_into_staging(cursor, table: str, columns: tuple, has_header: bool, source):
+    options = "FORMAT csv, HEADER true" if has_header else "FORMAT csv"
+    statement = sql.SQL("COPY {} ({}) FROM STDIN WITH ({})").format(
+        sql.Identifier(table), sql.SQL(", ").join(map(sql.Identifier, columns)), sql.SQL(options))
+    cursor.copy_expert(statement.as_string(cursor), source)
+
+
+def import_events(organization_id, columns: tuple, has_header: bool, source, organization_name: str = None) -> dict:
+    """Bulk-load events from a CSV stream with COPY and merge them in one statement.
+
+    Rows go to a temporary staging table first, then are upserted like
+    upsert_events (last row wins per (type, area, headline), identical rows are
+    not rewritten). Rows missing a required field are skipped. With
+    ``organization_name``, every inserted or updated event that has not expired
+    is queued in event_outbox in the same transaction, set-based on the server
+    so memory use does not grow with the import.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("""
+            CREATE TEMP TABLE import_events (
+                ord BIGSERIAL,
+                type TEXT,
+                area TEXT,
+                headline TEXT,
+                description TEXT,
+                instruction TEXT,
+                effective TIMESTAMPTZ,
+                expires TIMESTAMPTZ,
+                severity TEXT,
+                urgency TEXT
+            );
+            CREATE TEMP TABLE import_changed (id BIGINT, inserted BOOLEAN);
+        """)
+        copy_into_staging(cursor, "import_events", columns, has_header, source)
+
+        # Ids already present in the statement's snapshot were updated, the others inserted
+        cursor.execute("""
+            WITH existing AS (
+                SELECT e.id
+                FROM organization_events e
+                JOIN (SELECT DISTINCT type, area, headline FROM import_events) s
+                  ON (e.type, e.area, e.headline) = (s.type, s.area, s.headline)
+                WHERE e.organization_id = %(organization_id)s::uuid
+            ), merged AS (
+                INSERT INTO organization_events (organization_id, type, area, headline, description,
+                                                 instruction, effective, expires, severity, urgency)
+                SELECT DISTINCT ON (type, area, headline)
+                       %(organization_id)s::uuid, type, area, headline, NULLIF(BTRIM(description), ''),
+                       NULLIF(BTRIM(instruction), ''), effective, expires,
+                       NULLIF(BTRIM(severity), ''), NULLIF(BTRIM(urgency), '')
+                FROM import_events
+                WHERE type <> '' AND area <> '' AND headline <> ''
+                  AND effective IS NOT NULL AND expires IS NOT NULL
+                ORDER BY type, area, headline, ord DESC
+                ON CONFLICT (organization_id, type, area, headline)
+                DO UPDATE SET
+                    description = EXCLUDED.description,
+                    instruction = EXCLUDED.instruction,
+                    effective = EXCLUDED.effective,
+                    expires = EXCLUDED.expires,
+                    severity = EXCLUDED.severity,
+                    urgency = EXCLUDED.urgency,
+                    created_at = CURRENT_TIMESTAMP
+                WHERE (organization_events.description, organization_events.instruction,
+                       organization_events.effective, organization_events.expires,
+                       organization_events.severity, organization_events.urgency)
+                      IS DISTINCT FROM
+                      (EXCLUDED.description, EXCLUDED.instruction, EXCLUDED.effective,
+                       EXCLUDED.expires, EXCLUDED.severity, EXCLUDED.urgency)
+                RETURNING id
+            )
+            INSERT INTO import_changed (id, inserted)
+            SELECT id, id NOT IN (SELECT id FROM existing) FROM merged
+        """, {"organization_id": organization_id})
+
+        cursor.execute("""
+            SELECT
+                (SELECT COUNT(*) FROM import_events),
+                (SELECT COUNT(*) FROM (
+                    SELECT DISTINCT type, area, headline FROM import_events
+                    WHERE type <> '' AND area <> '' AND headline <> ''
+                      AND effective IS NOT NULL AND expires IS NOT NULL) AS valid),
+                (SELECT COUNT(*) FILTER (WHERE inserted) FROM import_changed),
+                (SELECT COUNT(*) FILTER (WHERE NOT inserted) FROM import_changed)
+        """)
+        received, distinct, inserted, updated = cursor.fetchone()
+
+        published = 0
+        if organization_name is not None:
+            cursor.execute("""
+                INSERT INTO event_outbox (payload)
+                SELECT jsonb_build_object(
+                           'type', e.type, 'area', e.area, 'headline', e.headline,
+                           'description', e.description, 'instruction', e.instruction,
+                           'effective', e.effective, 'expires', e.expires,
+                           'severity', e.severity, 'urgency', e.urgency,
+                           'organization_id', e.organization_id, 'organization_name', %(organization_name)s::text)
+                FROM import_changed c
+                JOIN organization_events e ON e.organization_id = %(organization_id)s::uuid AND e.id = c.id
+                WHERE e.expires >= NOW()
+                ORDER BY c.id
+            """, {"organization_id": organization_id, "organization_name": organization_name})
+            published = cursor.rowcount
+
+        conn.commit()
+
+        return {
+            "received": received,
+            "inserted": inserted,
+            "updated": updated,
+            "unchanged": distinct - inserted - updated,
+            "skipped": received - distinct,
+            "published": published,
+        }
+
+    except Exception:
+        conn.rollback()
+        raise
+
+    finally:
+        try:
+            cursor.execute("DROP TABLE IF EXISTS import_events, import_changed")
+            conn.commit()
+        except psycopg2.Error:
+            pass
+        cursor.close()
+        release_connection(conn)
+
+
+def import_oncall(organization_id, columns: tuple, has_header: bool, source) -> dict:
+    """Bulk-load on-call rows from a CSV stream with COPY; rows whose natural key is already stored are skipped."""
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("""
+            CREATE TEMP TABLE import_oncall (
+                on_call_email TEXT,
+                on_call_from TIMESTAMPTZ,
+                on_call_to TIMESTAMPTZ,
+                levels JSONB,
+                areas JSONB
+            );
+        """)
+        copy_into_staging(cursor, "import_oncall", columns, has_header, source)
+
+        cursor.execute("SELECT COUNT(*) FROM import_oncall")
+        received = cursor.fetchone()[0]
+        cursor.execute("""
+            INSERT INTO organization_oncall (organization_id, on_call_email, on_call_from,
+                                             on_call_to, levels, areas, natural_key)
+            SELECT %s::uuid, s.on_call_email, s.on_call_from, s.on_call_to, s.levels, s.areas,
+                   oncall_natural_key(s.on_call_email, s.on_call_from, s.on_call_to, s.levels, s.areas)
+            FROM import_oncall s
+            WHERE s.on_call_email <> '' AND s.on_call_from IS NOT NULL AND s.on_call_to IS NOT NULL
+              AND s.levels IS NOT NULL AND s.areas IS NOT NULL
+            ON CONFLICT (organization_id, natural_key) DO NOTHING
+        """, (organization_id,))
+        inserted = cursor.rowcount
+        conn.commit()
+
+        return {"received": received, "inserted": inserted, "existing_or_skipped": received - inserted}
+
+    except Exception:
+        conn.rollback()
+        raise
+
+    finally:
+        try:
+            cursor.execute("DROP TABLE IF EXISTS import_oncall")
+            conn.commit()
+        except psycopg2.Error:
+            pass
+        cursor.close()
+        release_connection(conn)
@@ -0,0 +1,134 @@
+import csv
+import io
+import json
+import queue
+
+# Columns accepted by the bulk import, in COPY order; the first ones are required
+EVENT_IMPORT_COLUMNS = (
+    "type", "area", "headline", "effective", "expires",
+    "description", "instruction", "severity", "urgency",
+)
+EVENT_REQUIRED_COLUMNS = EVENT_IMPORT_COLUMNS[:5]
+
+ONCALL_IMPORT_COLUMNS = ("on_call_email", "on_call_from", "on_call_to", "levels", "areas")
+ONCALL_REQUIRED_COLUMNS = ONCALL_IMPORT_COLUMNS
+
+JSON_COLUMNS = {"levels", "areas"}
+
+# Queued by the request reader instead of the None end marker when the upload broke off
+IMPORT_ABORTED = object()
+
+
+class ImportFailed(Exception):
+    """The uploaded data cannot be imported; the message is safe to return to the client."""
+
+
+def iter_queue(chunks: queue.Queue):
+    """Yield byte chunks put on ``chunks`` by the request reader until the None sentinel."""
+    while True:
+        chunk = chunks.get()
+        if chunk is None:
+            return
+        if chunk is IMPORT_ABORTED:
+            raise ImportFailed("Upload interrupted")
+        if chunk:
+            yield chunk
+
+
+def iter_lines(chunks):
+    """Split a byte stream into lines without holding more than one partial line."""
+    pending = b""
+    for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        yield from lines
+    if pending:
+        yield pending
+
+
+def ndjson_to_csv(chunks, columns: tuple):
+    """Convert NDJSON objects to CSV rows of ``columns`` for COPY, one line at a time."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+
+    for number, line in enumerate(iter_lines(chunks), start=1):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError as e:
+            raise ImportFailed(f"Line {number}: invalid JSON ({e})")
+        if not isinstance(item, dict):
+            raise ImportFailed(f"Line {number}: expected a JSON object")
+
+        writer.writerow([
+            json.dumps(item.get(column)) if column in JSON_COLUMNS and item.get(column) is not None
+            else item.get(column)
+            for column in columns
+        ])
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def read_csv_header(chunks, allowed: tuple, required: tuple):
+    """Read the CSV header from ``chunks``; returns (columns, chunks including the header)."""
+    chunks = iter(chunks)
+    head = b""
+    for chunk in chunks:
+        head += chunk
+        if b"\n" in head:
+            break
+
+    header_line = head.split(b"\n", 1)[0].lstrip(b"\xef\xbb\xbf").decode("utf-8").strip()
+    columns = tuple(column.strip() for column in next(csv.reader([header_line]), []))
+    unknown = [column for column in columns if column not in allowed]
+    missing = [column for column in required if column not in columns]
+    if unknown or missing:
+        raise ImportFailed(f"CSV header: unknown columns {unknown}, missing columns {missing}")
+
+    def rest():
+        yield head
+        yield from chunks
+
+    return columns, rest()
+
+
+class StreamReader:
+    """Minimal file object over an iterator of byte chunks, as expected by copy_expert.
+
+    psycopg2 turns an exception raised inside read() into a generic COPY failure,
+    so the original one is kept in ``error`` for the caller to re-raise.
+    """
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = b""
+        self.error = None
+
+    def read(self, size: int = -1) -> bytes:
+        while size < 0 or len(self._buffer) < size:
+            try:
+                chunk = next(self._chunks, None)
+            except Exception as e:
+                self.error = e
+                raise
+            if chunk is None:
+                break
+            self._buffer += chunk
+
+        if size < 0:
+            data, self._buffer = self._buffer, b""
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+def open_copy_source(chunks, data_format: str, allowed: tuple, required: tuple):
+    """Turn an uploaded NDJSON or CSV byte stream into (columns, csv_has_header, file for COPY)."""
+    if data_format == "ndjson":
+        return allowed, False, StreamReader(ndjson_to_csv(chunks, allowed))
+    if data_format == "csv":
+        columns, stream = read_csv_header(chunks, allowed, required)
+        return columns, True, StreamReader(stream)
+    raise ImportFailed(f"Unsupported format '{data_format}', expected ndjson or csv")
@@ -1,25 +1,69 @@
 # companies-sync/main.py
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
+from starlette.concurrency import run_in_threadpool
 from typing import Optional
-from datetime import datetime, timezone
-from publisher import publish_event
+from publisher import publisher_stats, start_publisher, stop_publisher, wake_publisher
+from org_cache import OrganizationCache
+from importer import (
+    EVENT_IMPORT_COLUMNS,
+    EVENT_REQUIRED_COLUMNS,
+    IMPORT_ABORTED,
+    ONCALL_IMPORT_COLUMNS,
+    ONCALL_REQUIRED_COLUMNS,
+    ImportFailed,
+    iter_queue,
+    open_copy_source
+)
+import asyncio
+import hashlib
 import logging
+import os
+import psycopg2
+import queue
 import time
 from db import (
     insert_organization,
     get_organization_id_by_name,
-    insert_or_update_event,
+    upsert_events,
     create_tables,
     insert_oncall_schedule,
     get_active_oncall,
-    get_active_events
+    get_active_events,
+    get_active_events_version,
+    close_pool,
+    drain_outbox,
+    import_events,
+    import_oncall,
+    pool_stats,
+    POOL_CONFIG
 )
 
 logging.basicConfig(level=logging.INFO)
 
-app = FastAPI()
+EVENTS_CACHE_CONTROL = os.getenv("EVENTS_CACHE_CONTROL", "private, no-cache")
+GZIP_MINIMUM_SIZE = int(os.getenv("GZIP_MINIMUM_SIZE", "1000"))
+ORG_CACHE_TTL = float(os.getenv("ORG_CACHE_TTL", "300"))
+ORG_CACHE_NEGATIVE_TTL = float(os.getenv("ORG_CACHE_NEGATIVE_TTL", "30"))
+ORG_CACHE_SIZE = int(os.getenv("ORG_CACHE_SIZE", "10000"))
+IMPORT_QUEUE_CHUNKS = int(os.getenv("IMPORT_QUEUE_CHUNKS", "16"))
+# Each running import holds a pooled connection and a worker thread; keep some for everything else
+IMPORT_MAX_CONCURRENT = max(1, min(int(os.getenv("IMPORT_MAX_CONCURRENT", "2")), POOL_CONFIG["maxconn"] - 1))
+IMPORT_RETRY_AFTER = os.getenv("IMPORT_RETRY_AFTER", "30")
+
+EVENT_FIELDS = (
+    "id", "type", "area", "headline", "description", "instruction",
+    "effective", "expires", "severity", "urgency", "created_at",
+)
+SUMMARY_FIELDS = ("headline", "area", "severity", "effective", "expires")
+
+app = FastAPI(default_response_class=ORJSONResponse)
+organizations = OrganizationCache(ORG_CACHE_TTL, ORG_CACHE_NEGATIVE_TTL, ORG_CACHE_SIZE)
+import_slots = asyncio.Semaphore(IMPORT_MAX_CONCURRENT)
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MINIMUM_SIZE)
 
 origins = ["http://localhost:3000", "http://127.0.0.1:3000"]
 
@@ -38,33 +82,88 @@ def startup():
         try:
             create_tables()
             logging.info("DB ready, tables ensured.")
+            start_publisher(drain_outbox)
             return
         except Exception as e:
             logging.warning(f"DB not ready ({i+1}/10): {e}")
             time.sleep(2)
     raise RuntimeError("DB not reachable after retries")
 
+def resolve_organization(org_name: str):
+    """Organization id for ``org_name`` or None, from the cache when possible."""
+    org_id = organizations.get(org_name)
+    if org_id is OrganizationCache.MISSING:
+        return None
+    if org_id is None:
+        org_id = get_organization_id_by_name(org_name)
+        organizations.put(org_name, org_id)
+    return org_id
+
+def ensure_organization(org_name: str):
+    """Organization id for ``org_name``, creating it if needed; returns (organization_id, created)."""
+    org_id = organizations.get(org_name)
+    if org_id is not None and org_id is not OrganizationCache.MISSING:
+        return org_id, False
+
+    org_id, created = insert_organization(org_name)
+    if org_id is not None:
+        organizations.put(org_name, org_id)
+    return org_id, created
+
+def parse_fields(fields: Optional[str], summary: bool) -> Optional[tuple]:
+    """Columns requested via ``fields=`` or ``summary``; None means every column."""
+    if summary:
+        return SUMMARY_FIELDS
+    if not fields:
+        return None
+
+    requested = tuple(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+    unknown = [f for f in requested if f not in EVENT_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400,
+                            detail=f"Unknown fields {unknown}, expected any of {list(EVENT_FIELDS)}")
+    return requested or None
+
+def events_etag(organization_id, areas: list, version, fields: Optional[tuple] = None) -> str:
+    """Weak version token of an active-event result: organization, area set, projection, row count and newest row."""
+    count, newest = version
+    token = f"{organization_id}|{sorted({a.lower() for a in areas})}|{fields}|{count}|{newest}"
+    return 'W/"' + hashlib.sha1(token.encode("utf-8")).hexdigest() + '"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or etag.removeprefix("W/") in candidates
+
+@app.on_event("shutdown")
+def shutdown():
+    stop_publisher()
+    close_pool()
+
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
+@app.get("/metrics")
+def metrics():
+    return {"db_pool": pool_stats(), "organizations": organizations.stats(), "publisher": publisher_stats()}
+
 @app.post("/organizations")
 def api_create_organization(name: str):
     print(f"Creating organization: {name}")
-    old_id = get_organization_id_by_name(name)
-    insert_organization(name)
-    new_id = get_organization_id_by_name(name)
+    org_id, created = ensure_organization(name)
 
-    if old_id:
+    if org_id and not created:
         return {
             "status": "exists",
-            "organization_id": old_id,
+            "organization_id": org_id,
             "message": "Organization already existed. No new insert."
         }
-    if new_id:
+    if org_id:
         return {
             "status": "inserted",
-            "organization_id": new_id,
+            "organization_id": org_id,
             "message": "Organization successfully created."
         }
 
@@ -74,47 +173,30 @@ def api_create_organization(name: str):
 def api_receive_events(payload: dict):
     org_name = payload.get("organization_name")
     events = payload.get("events", [])
-    now = datetime.now(timezone.utc)
 
     if not org_name:
         raise HTTPException(status_code=400, detail="Missing organization_name")
 
-    insert_organization(org_name)
-    org_id = get_organization_id_by_name(org_name)
-    results = []
-
-    for event in events:
-        event["organization_id"] = org_id
-        event["organization_name"] = org_name
-        status = insert_or_update_event(event)
-
-        expires_str = event.get("expires")
-        publish = True
-        try:
-            expires_dt = datetime.fromisoformat(expires_str)
-            expires = expires_dt.replace(tzinfo=timezone.utc)
-            if expires < now:
-                publish = False
-        except Exception as e:
-            publish = False
-            
-        if status in ("inserted", "updated") and publish:
-            publish_event(event)
+    org_id, _ = ensure_organization(org_name)
+    if not org_id:
+        raise HTTPException(status_code=500, detail="Failed to insert or retrieve organization")
 
-        results.append({
-            "headline": event["headline"],
-            "status": status,
-            "publish": publish
-        })
+    # Changed, unexpired events are queued in the outbox in the same transaction
+    results = upsert_events(org_id, events, org_name)
+    if any(queued for _, queued in results):
+        wake_publisher()
 
     return {
         "organization": org_name,
-        "results": results
+        "results": [
+            {"headline": event.get("headline"), "status": status, "publish": queued}
+            for event, (status, queued) in zip(events, results)
+        ]
     }
 
 @app.post("/organizations/{org_name}/oncall")
 def api_add_oncall(org_name: str, payload: dict):
-    org_id = get_organization_id_by_name(org_name)
+    org_id = resolve_organization(org_name)
     if not org_id:
         raise HTTPException(status_code=404, detail="Organization not found")
 
@@ -130,7 +212,7 @@ def api_add_oncall(org_name: str, payload: dict):
 
 @app.get("/oncall/active")
 def api_get_oncall(organization_name: str, area: str):
-    org_id = get_organization_id_by_name(organization_name)
+    org_id = resolve_organization(organization_name)
     if not org_id:
         raise HTTPException(status_code=404, detail="Organization not found")
 
@@ -138,13 +220,109 @@ def api_get_oncall(organization_name: str, area: str):
 
 
 @app.get("/events/active")
-def api_get_active_events(organization_name: str, areas: str):
-    org_id = get_organization_id_by_name(organization_name)
+def api_get_active_events(organization_name: str, areas: str, fields: Optional[str] = None,
+                          summary: bool = False, if_none_match: Optional[str] = Header(None)):
+    org_id = resolve_organization(organization_name)
     if not org_id:
         raise HTTPException(status_code=404, detail="Organization not found")
 
     areas_list = [a.strip() for a in areas.split(",") if a.strip()]
-    return get_active_events(org_id, areas_list)
+    selected = parse_fields(fields, summary)
+
+    version = get_active_events_version(org_id, areas_list)
+    if version is None:
+        return ORJSONResponse(get_active_events(org_id, areas_list, selected))
+
+    etag = events_etag(org_id, areas_list, version, selected)
+    headers = {"ETag": etag, "Cache-Control": EVENTS_CACHE_CONTROL}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    # Rendered by orjson directly, skipping FastAPI's jsonable_encoder pass
+    return ORJSONResponse(get_active_events(org_id, areas_list, selected), headers=headers)
+
+
+def run_import(kind: str, org_id, org_name: str, data_format: str, chunks: queue.Queue) -> dict:
+    """Worker-thread side of an import: COPY the queued upload and merge it."""
+    if kind == "oncall":
+        columns, has_header, source = open_copy_source(
+            iter_queue(chunks), data_format, ONCALL_IMPORT_COLUMNS, ONCALL_REQUIRED_COLUMNS)
+    else:
+        columns, has_header, source = open_copy_source(
+            iter_queue(chunks), data_format, EVENT_IMPORT_COLUMNS, EVENT_REQUIRED_COLUMNS)
+
+    try:
+        if kind == "oncall":
+            return import_oncall(org_id, columns, has_header, source)
+        result = import_events(org_id, columns, has_header, source, organization_name=org_name)
+        if result["published"]:
+            wake_publisher()
+        return result
+    except psycopg2.Error:
+        # Surface a bad line or an aborted upload instead of the generic COPY failure
+        if source.error is not None:
+            raise source.error
+        raise
+
+async def enqueue(chunks: queue.Queue, item, job: asyncio.Task) -> bool:
+    """Hand ``item`` to the import thread, waiting while the queue is full; False once the import ended."""
+    while not job.done():
+        try:
+            chunks.put_nowait(item)
+            return True
+        except queue.Full:
+            await asyncio.sleep(0.005)
+    return False
+
+async def stream_import(org_name: str, kind: str, request: Request, format: str) -> dict:
+    """Feed the request body to run_import in a worker thread and return its counts."""
+    if kind == "events":
+        org_id, _ = await run_in_threadpool(ensure_organization, org_name)
+    else:
+        org_id = await run_in_threadpool(resolve_organization, org_name)
+    if not org_id:
+        raise HTTPException(status_code=404, detail="Organization not found")
+
+    chunks = queue.Queue(IMPORT_QUEUE_CHUNKS)
+    job = asyncio.ensure_future(run_in_threadpool(run_import, kind, org_id, org_name, format, chunks))
+    try:
+        async for chunk in request.stream():
+            if not await enqueue(chunks, chunk, job):
+                break
+        await enqueue(chunks, None, job)
+    except BaseException:
+        # Client went away mid-upload: make the import roll back instead of committing a prefix
+        await enqueue(chunks, IMPORT_ABORTED, job)
+        await asyncio.wait([job])
+        raise
+
+    try:
+        result = await job
+    except ImportFailed as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except psycopg2.DataError as e:
+        raise HTTPException(status_code=400, detail=(e.pgerror or str(e)).strip())
+
+    logging.info(f"Imported {kind} for {org_name}: {result}")
+    return {"organization": org_name, "kind": kind, **result}
+
+@app.post("/organizations/{org_name}/import/{kind}")
+async def api_import(org_name: str, kind: str, request: Request, format: str = "ndjson"):
+    """Stream a large NDJSON or CSV upload of events or on-call rows into the organization.
+
+    The body is read incrementally and fed to COPY through a small bounded queue,
+    so memory use does not depend on the upload size. Events are merged like
+    POST /events and only inserted or updated, unexpired events are published.
+    At most IMPORT_MAX_CONCURRENT imports run at once; further ones get 503.
+    """
+    if kind not in ("events", "oncall"):
+        raise HTTPException(status_code=404, detail="Import kind must be events or oncall")
+    if import_slots.locked():
+        raise HTTPException(status_code=503, detail="Too many imports in progress, retry later",
+                            headers={"Retry-After": IMPORT_RETRY_AFTER})
+
+    async with import_slots:
+        return await stream_import(org_name, kind, request, format)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,62 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+def normalize_name(org_name: str) -> str:
+    return " ".join(org_name.split())
+
+
+class OrganizationCache:
+    """Process-wide organization name → id cache.
+
+    Found ids are kept for ``ttl`` seconds. Unknown names are remembered as
+    missing for the shorter ``negative_ttl`` so repeated lookups of a bad name do
+    not hit the database, while an organization created by another pod becomes
+    visible soon. At most ``max_size`` names are kept, least recently used first out.
+    """
+
+    MISSING = object()
+
+    def __init__(self, ttl: float, negative_ttl: float, max_size: int):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "negative_hits": 0, "misses": 0}
+
+    def get(self, org_name: str):
+        """Cached id, ``MISSING`` for a cached miss, or None when the name must be looked up."""
+        key = normalize_name(org_name)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                self._entries.pop(key, None)
+                self._stats["misses"] += 1
+                return None
+
+            self._entries.move_to_end(key)
+            if entry[0] is self.MISSING:
+                self._stats["negative_hits"] += 1
+            else:
+                self._stats["hits"] += 1
+            return entry[0]
+
+    def put(self, org_name: str, org_id):
+        """Remember ``org_id``, or a miss when it is None."""
+        key = normalize_name(org_name)
+        if org_id is None:
+            value, expires = self.MISSING, time.monotonic() + self.negative_ttl
+        else:
+            value, expires = org_id, time.monotonic() + self.ttl
+
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), **self._stats}
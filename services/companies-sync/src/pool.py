@@ -0,0 +1,107 @@
+import queue
+import threading
+import time
+
+import psycopg2
+import psycopg2.extensions
+
+
+class PoolTimeout(Exception):
+    """No connection became free within the acquire timeout."""
+
+
+class ConnectionPool:
+    """Thread-safe psycopg2 pool that keeps its connections open for reuse.
+
+    Up to ``maxconn`` connections are opened on demand and kept, so the
+    prepared statements of db.py survive between requests (psycopg2's own pools
+    close every idle connection beyond ``minconn``). Callers wait up to
+    ``acquire_timeout`` seconds when all are in use. A connection idle for longer
+    than ``health_check_idle`` seconds is checked with ``SELECT 1`` and reopened
+    if the server dropped it.
+    """
+
+    def __init__(self, maxconn: int, acquire_timeout: float, health_check_idle: float, **connect_kwargs):
+        self.maxconn = maxconn
+        self.acquire_timeout = acquire_timeout
+        self.health_check_idle = health_check_idle
+        self.connect_kwargs = connect_kwargs
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        self._stats = {"open": 0, "in_use": 0, "acquired": 0, "timeouts": 0, "health_check_failures": 0}
+
+    def _count(self, key: str, amount: int = 1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def getconn(self):
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            self._count("timeouts")
+            raise PoolTimeout(f"No database connection available within {self.acquire_timeout}s")
+
+        try:
+            conn = self._idle_connection() or self._connect()
+        except Exception:
+            self._slots.release()
+            raise
+
+        self._count("acquired")
+        self._count("in_use")
+        return conn
+
+    def _idle_connection(self):
+        while True:
+            try:
+                conn, returned_at = self._idle.get_nowait()
+            except queue.Empty:
+                return None
+            if time.monotonic() - returned_at < self.health_check_idle:
+                return conn
+
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                conn.rollback()
+                return conn
+            except psycopg2.Error:
+                self._count("health_check_failures")
+                self._close(conn)
+
+    def _connect(self):
+        conn = psycopg2.connect(**self.connect_kwargs)
+        self._count("open")
+        return conn
+
+    def _close(self, conn):
+        self._count("open", -1)
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def putconn(self, conn):
+        try:
+            if conn.closed:
+                self._close(conn)
+                return
+            if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            self._idle.put((conn, time.monotonic()))
+        except psycopg2.Error:
+            self._close(conn)
+        finally:
+            self._count("in_use", -1)
+            self._slots.release()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"max_size": self.maxconn, **self._stats}
+
+    def closeall(self):
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._close(conn)
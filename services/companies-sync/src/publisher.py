@@ -1,17 +1,58 @@
 import pika
 import json
 import os
+import threading
 import time
 
 RABBIT_HOST = os.getenv("RABBITMQ_HOST")
 RABBIT_EXCHANGE = os.getenv("RABBITMQ_EXCHANGE")
 ROUTING_KEY = os.getenv("RABBITMQ_ROUTING_KEY")
+PUBLISH_CONFIRM_TIMEOUT = float(os.getenv("PUBLISH_CONFIRM_TIMEOUT", "30"))
+PUBLISH_POLL_INTERVAL = float(os.getenv("PUBLISH_POLL_INTERVAL", "5"))
 
+# Only the publisher thread touches these; pika connections are not thread-safe
 connection = None
 channel = None
 
+# Publisher-confirm state of the current channel: delivery tag of the next
+# publish, outcome (None until confirmed) of each outstanding tag, and the tags
+# the broker returned as unroutable
+next_delivery_tag = 1
+outcomes = {}
+returned = set()
+
+publisher_thread = None
+stop_event = threading.Event()
+wake_event = threading.Event()
+stats_lock = threading.Lock()
+stats = {"published": 0, "drains": 0, "failures": 0}
+
+
+def count(key: str, amount: int = 1):
+    with stats_lock:
+        stats[key] += amount
+
+def on_confirm(frame):
+    method = frame.method
+    acked = isinstance(method, pika.spec.Basic.Ack)
+    if method.multiple:
+        tags = [tag for tag in outcomes if tag <= method.delivery_tag]
+    else:
+        tags = [method.delivery_tag]
+
+    for tag in tags:
+        if tag in outcomes and outcomes[tag] is None:
+            # A Basic.Return always arrives before the ack of the same message
+            outcomes[tag] = acked and tag not in returned
+
+def on_return(_channel, method, properties, _body):
+    tag = int(properties.message_id)
+    print(f"[RabbitMQ] Message {tag} returned as unroutable: {method.reply_text}")
+    if tag in outcomes:
+        returned.add(tag)
+
 def get_channel():
-    global connection, channel
+    global connection, channel, next_delivery_tag
 
     if channel and channel.is_open:
         return channel
@@ -31,8 +72,17 @@ def get_channel():
                 durable=True
             )
 
-            # Enable publisher confirms
-            channel.confirm_delivery()
+            # BlockingChannel waits for each confirm in turn, so confirms and
+            # returns are taken from the underlying channel to pipeline a batch
+            selected = []
+            channel._impl.confirm_delivery(on_confirm, callback=selected.append)
+            channel._impl.add_on_return_callback(on_return)
+            while not selected:
+                connection.process_data_events(time_limit=1)
+
+            next_delivery_tag = 1
+            outcomes.clear()
+            returned.clear()
             return channel
 
         except Exception as e:
@@ -41,25 +91,118 @@ def get_channel():
 
     raise RuntimeError("Cannot connect to RabbitMQ")
 
-def publish_event(event: dict):
-    body = json.dumps(event)
+def reset_connection():
+    global connection, channel
 
     try:
-        ch = get_channel()
-
-        ch.basic_publish(
-            exchange=RABBIT_EXCHANGE,
-            routing_key=ROUTING_KEY,
-            body=body,
-            properties=pika.BasicProperties(
-                delivery_mode=2  # Persistent
-            ),
-            mandatory=True,
-        )
-        print("[RabbitMQ] Published:", event["headline"])
-
-    except pika.exceptions.UnroutableError:
-        print("[RabbitMQ] Message was unroutable → LOST")
-
+        if connection and connection.is_open:
+            connection.close()
     except Exception as e:
-        print(f"[RabbitMQ] Publish error: {e}")
\ No newline at end of file
+        print(f"[RabbitMQ] Close failed: {e}")
+    connection = None
+    channel = None
+
+def publish_batch(events: list) -> list:
+    """Publish events with pipelined publisher confirms.
+
+    All events go out as mandatory messages before waiting, so the batch costs
+    one confirm round-trip instead of one per message. Returns one flag per
+    event: True when the broker acked it and did not return it as unroutable.
+    Nacked, returned and unconfirmed (after PUBLISH_CONFIRM_TIMEOUT) events are
+    False and stay in the outbox. Raises when the connection fails mid-batch.
+    """
+    global next_delivery_tag
+
+    ch = get_channel()
+    tags = []
+
+    try:
+        for event in events:
+            tag = next_delivery_tag
+            next_delivery_tag += 1
+            outcomes[tag] = None
+            tags.append(tag)
+            ch._impl.basic_publish(
+                exchange=RABBIT_EXCHANGE,
+                routing_key=ROUTING_KEY,
+                body=json.dumps(event),
+                properties=pika.BasicProperties(
+                    delivery_mode=2,  # Persistent
+                    message_id=str(tag),
+                ),
+                mandatory=True,
+            )
+
+        deadline = time.monotonic() + PUBLISH_CONFIRM_TIMEOUT
+        while any(outcomes[tag] is None for tag in tags):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                print(f"[RabbitMQ] Confirm timeout, {sum(outcomes[tag] is None for tag in tags)} events unconfirmed")
+                break
+            connection.process_data_events(time_limit=min(remaining, 1.0))
+
+        confirmed = [bool(outcomes[tag]) for tag in tags]
+    except Exception:
+        reset_connection()
+        raise
+    finally:
+        for tag in tags:
+            outcomes.pop(tag, None)
+            returned.discard(tag)
+
+    print(f"[RabbitMQ] Published {sum(confirmed)} of {len(events)} events")
+    return confirmed
+
+def wait_for_work(seconds: float):
+    """Sleep until woken or ``seconds`` pass, keeping the broker connection's heartbeats serviced."""
+    deadline = time.monotonic() + seconds
+    while not stop_event.is_set():
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or wake_event.wait(min(remaining, 1.0)):
+            return
+        if connection and connection.is_open:
+            try:
+                connection.process_data_events(0)
+            except Exception as e:
+                print(f"[RabbitMQ] Connection lost while idle: {e}")
+                reset_connection()
+
+def publisher_loop(drain_outbox):
+    while not stop_event.is_set():
+        wake_event.clear()
+        try:
+            count("published", drain_outbox(publish_batch))
+            count("drains")
+        except Exception as e:
+            count("failures")
+            print(f"[RabbitMQ] Outbox drain failed, will retry: {e}")
+        # Events written by this pod wake the loop at once; the poll picks up
+        # those of other pods and retries of unconfirmed ones
+        wait_for_work(PUBLISH_POLL_INTERVAL)
+    reset_connection()
+
+def start_publisher(drain_outbox):
+    """Start the background thread that owns the broker connection and drains the event outbox.
+
+    Called once from the startup hook; ``drain_outbox`` is db.drain_outbox.
+    """
+    global publisher_thread
+
+    stop_event.clear()
+    publisher_thread = threading.Thread(target=publisher_loop, args=(drain_outbox,), daemon=True)
+    publisher_thread.start()
+
+def stop_publisher(timeout: float = 10):
+    """Stop the publisher thread; events still in the outbox are sent after the next start."""
+    stop_event.set()
+    wake_event.set()
+    if publisher_thread is not None:
+        publisher_thread.join(timeout)
+
+def wake_publisher():
+    """Drain the outbox now instead of at the next poll, after events were written to it."""
+    wake_event.set()
+
+def publisher_stats() -> dict:
+    with stats_lock:
+        return {**stats, "running": publisher_thread is not None and publisher_thread.is_alive()}